@@ -1,4 +1,9 @@
+import threading
+import time
+APP_START = time.perf_counter()
+
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
@@ -11,15 +16,19 @@ from kivy.uix.image import Image
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.gridlayout import GridLayout
 from kivy.core.window import Window
-from src.Phineas_AI import Phineas_AI
-from src.PhineasBot import ChatBotWithVectors
+from src.warmup import Warmup
+KIVY_IMPORTED = time.perf_counter()
 
 
 # Set the background color to a light grey
 Window.clearcolor = (0.95, 0.95, 0.95, 1)
 
-ai = Phineas_AI()
-bot=ChatBotWithVectors()
+# Heavy components are built in the background once the window is up, in this order
+services = Warmup()
+services.timings["kivy"] = (KIVY_IMPORTED - APP_START, 0.0)
+services.register("ai", "src.Phineas_AI", "Phineas_AI", priority=0)
+services.register("bot", "src.PhineasBot", "get_shared_bot", priority=1)
+services.register("whisper", "src.whisper_registry", "get_model", priority=2)
 
 class SubjectSelectPage(BoxLayout):
     def __init__(self, switch_to_subject_page, **kwargs):
@@ -81,6 +90,7 @@ class SubjectSelectPage(BoxLayout):
 class SubjectSelectedPage(BoxLayout):
     def __init__(self, subject_name, switch_to_subject_select_page, **kwargs):
         super().__init__(**kwargs)
+        self.subject_name = subject_name
         self.orientation = 'vertical'
         self.padding = 20
         self.spacing = 20
@@ -105,23 +115,28 @@ class SubjectSelectedPage(BoxLayout):
         subject_repo_layout = BoxLayout(orientation='horizontal', size_hint_y=None, height=60, spacing=10)
         subject_repo_layout.add_widget(Label(text=subject_name, font_size=24, color=(0, 0, 0, 1)))
         accessrepobutton = Button(text='Access Repo', font_size=18, background_color=(0.2, 0.6, 0.8, 1), color=(1, 1, 1, 1))
-        accessrepobutton.bind(on_press=lambda instance: ai.openrepo())
+        accessrepobutton.bind(on_press=lambda instance: services.get('ai').openrepo())
         subject_repo_layout.add_widget(accessrepobutton)
         left_layout.add_widget(subject_repo_layout)
 
         # Transcription Controls
         transcription_layout = BoxLayout(orientation='horizontal', size_hint_y=None, height=60, spacing=10)
         startbutton = Button(text='Start Transcription', background_color=(0.2, 0.6, 0.8, 1), color=(1, 1, 1, 1), font_size=18)
-        startbutton.bind(on_press=lambda instance: self.animate_button(instance, lambda *args: ai.start_transcription(subject_name)))
+        startbutton.bind(on_press=lambda instance: self.animate_button(instance, lambda *args: services.get('ai').start_transcription(subject_name)))
         transcription_layout.add_widget(startbutton)
         puasebutton = Button(text='Pause', background_color=(0.2, 0.6, 0.8, 1), color=(1, 1, 1, 1), font_size=18)
-        puasebutton.bind(on_press=lambda instance: self.animate_button(instance, lambda *args: ai.pause_transcription()))
+        puasebutton.bind(on_press=lambda instance: self.animate_button(instance, lambda *args: services.get('ai').pause_transcription()))
         transcription_layout.add_widget(puasebutton)
         stopbutton = Button(text='Stop Transcription', background_color=(0.2, 0.6, 0.8, 1), color=(1, 1, 1, 1), font_size=18)
-        stopbutton.bind(on_press=lambda instance: self.animate_button(instance, lambda *args: ai.stop_transcription()))
+        stopbutton.bind(on_press=lambda instance: self.animate_button(instance, lambda *args: services.get('ai').stop_transcription()))
         transcription_layout.add_widget(stopbutton)
         left_layout.add_widget(transcription_layout)
 
+        # Progress of lectures being saved, transcribed and summarized in the background
+        self.status_label = Label(text='', size_hint_y=None, height=60, font_size=16, color=(0, 0, 0, 1))
+        left_layout.add_widget(self.status_label)
+        self.status_event = Clock.schedule_interval(self.update_status, 1)
+
         main_layout.add_widget(left_layout)
 
         # # To-Do List
@@ -154,14 +169,29 @@ class SubjectSelectedPage(BoxLayout):
         anim.bind(on_complete=lambda *args: callback())
         anim.start(button)
 
+    def update_status(self, dt):
+        if not services.is_ready('ai'):
+            return
+        error = services.error('ai')
+        if error is not None:
+            # get() would raise it again every second; show it once and stop polling
+            self.status_label.text = f"Recording is unavailable: {error}"
+            self.stop_status()
+            return
+        self.status_label.text = services.get('ai').pipeline.status_text()
+
+    def stop_status(self):
+        self.status_event.cancel()
+
     def open_phineas_popup(self, instance):
-        popup = PhineasPopup()
+        popup = PhineasPopup(subject=self.subject_name)
         popup.open()
 
 class PhineasPopup(Popup):
-    def __init__(self, **kwargs):
+    def __init__(self, subject=None, **kwargs):
         super().__init__(**kwargs)
         self.title = 'Phineas AI'
+        self.subject = subject  # Whose saved conversation the questions continue; None for the general chat
         self.size_hint = (0.8, 0.8)
 
         # Main layout for the popup
@@ -193,14 +223,38 @@ class PhineasPopup(Popup):
 
         self.content = layout
 
+        self.cancel_event = None  # Set to stop the answer currently streaming in
+        self.bind(on_dismiss=lambda *args: self.cancel_answer())
+
     def handle_user_input(self, instance):
         user_message = self.text_input.text.strip()
         if user_message:
             self.add_message("You", user_message)
             self.text_input.text = ""
-            output_message = bot.ask(user_message)
-            # Simulate a response (replace this with actual AI/logic integration)
-            self.add_message("Phineas AI",output_message)
+            self.cancel_answer()
+            # The answer streams in on a worker thread so the UI never waits on Groq
+            label = self.add_message("Phineas AI", "...")
+            self.cancel_event = threading.Event()
+            threading.Thread(target=self.stream_answer, args=(user_message, label, self.cancel_event), daemon=True).start()
+
+    def cancel_answer(self):
+        if self.cancel_event:
+            self.cancel_event.set()
+
+    def stream_answer(self, user_message, label, cancel_event):
+        output_message = ""
+        try:
+            for piece in services.get('bot').ask_stream(user_message, cancel_event, self.subject):
+                output_message += piece
+                # Widgets may only be touched from the Kivy main thread
+                Clock.schedule_once(lambda dt, text=output_message: self.set_message(label, "Phineas AI", text))
+        except Exception as e:
+            error_message = f"An error occurred: {e}"
+            Clock.schedule_once(lambda dt: self.set_message(label, "Phineas AI", error_message))
+
+    def set_message(self, label, sender, message):
+        label.text = f"[b]{sender} : [/b] {message}"
+        self.chat_layout.parent.scroll_y = 0
 
     def add_message(self, sender, message):
         # Add a message to the chat
@@ -219,6 +273,7 @@ class PhineasPopup(Popup):
 
         # Scroll to the bottom
         self.chat_layout.parent.scroll_y = 0
+        return message_label
 
 class PhineasApp(App):
     def build(self):
@@ -228,12 +283,18 @@ class PhineasApp(App):
         self.root.add_widget(self.subject_select_page)
         return self.root
 
+    def on_start(self):
+        services.window_shown = time.perf_counter() - APP_START
+        services.start()
+
     def switch_to_subject_page(self, subject_name):
         self.subject_selected_page = SubjectSelectedPage(subject_name, self.switch_to_subject_select_page)
         self.root.clear_widgets()
         self.root.add_widget(self.subject_selected_page)
 
     def switch_to_subject_select_page(self, instance):
+        if self.subject_selected_page:
+            self.subject_selected_page.stop_status()
         self.root.clear_widgets()
         self.root.add_widget(self.subject_select_page)
 
@@ -1,10 +1,18 @@
+import json
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from langchain.chains import ConversationChain
 from langchain_groq import ChatGroq
 from langchain.memory import ConversationBufferWindowMemory
 from dotenv import load_dotenv
 from src.vectorstoreai import EmbeddingManager
+from src.tokenbudget import TokenBudget, count_tokens, pack_by_tokens, split_by_tokens
+from src.llm_cache import LLMCache
+from src.chat_history import ChatHistoryStore, GENERAL_SUBJECT
+from src.ratelimit import TokenBucket, with_retries
 
 # Ensure the Logs directory exists
 log_dir = os.path.join("Phineas_AI", "Data", "Logs")
@@ -18,6 +26,29 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+STRUCTURED_SUMMARY_PROMPT = (
+    "Read the following {source} and reply with only a JSON object with these keys:\n"
+    '"summary": a paragraph summarizing it,\n'
+    '"key_points": a list of the key points,\n'
+    '"homework": a list of homework or assignments mentioned (empty if none),\n'
+    '"qa": a list of {{"question": ..., "answer": ...}} for questions students asked (empty if none).\n\n'
+    "{text}"
+)
+
+def _as_text(value):
+    """Render a JSON summary field as plain lines for the summary file."""
+    if not value:
+        return ""
+    if isinstance(value, str):
+        return value.strip()
+    lines = []
+    for item in value:
+        if isinstance(item, dict):
+            lines.append(f"Q: {item.get('question', '')}\nA: {item.get('answer', '')}")
+        else:
+            lines.append(f"- {item}")
+    return "\n".join(lines)
+
 class ChatBotWithVectors:
     def __init__(self):
         # Load environment variables from .env file
@@ -26,86 +57,244 @@ class ChatBotWithVectors:
         # Initialize required components
         self.groq_api_key = os.getenv("GROQ_API_KEY")
         self.model_name = "llama3-70b-8192"
-        self.chat_history = []
+        self.chat_history = ChatHistoryStore()  # Turns of the current subject, kept under Phineas_AI/Data/Chats
+        self.chat_lock = threading.Lock()  # The recorder and the chat popup share one instance
 
-        self.memory = ConversationBufferWindowMemory(k=10)  # Store the last 10 interactions
+        self.memory_turns = 10  # Most past turns a prompt carries; fewer when the token budget is tight
+        self.memory = ConversationBufferWindowMemory(k=self.memory_turns)
+        self.token_budget = TokenBudget()  # Caps the prompt built by ask()
+        self.retrieval_k = 5  # Candidate chunks fetched before the budget trims them
+        self.last_usage = {}  # Prompt tokens per source for the last ask()
 
         # Initialize Groq LLM
         self.groq_chat = ChatGroq(
             groq_api_key=self.groq_api_key,
             model_name=self.model_name
         )
+        # One chain for the whole session: memory gets one new turn per question instead of a rebuild
+        self.conversation = ConversationChain(llm=self.groq_chat, memory=self.memory)
+        self._load_memory()
 
         self.keypoints=""
+        self.summary_chunk_tokens = 3000  # Longer transcripts are summarized chunk by chunk (map-reduce)
+        self.summary_concurrency = 4  # Groq requests in flight during the map step
 
         # Initialize embedding manager
         self.embedding_manager = EmbeddingManager()
 
+        # Identical prompts are answered from disk instead of going back to Groq
+        self.llm_cache = LLMCache()
+        self.semantic_cache = False  # Also reuse answers to near-duplicate questions, ignoring chat history
+
+        # Bulk question answering (ask_many) shares one request budget across its worker threads
+        self.rate_limiter = TokenBucket(requests_per_minute=30)
+        self.ask_many_concurrency = 8
+        self.last_batch_stats = {}
+
         logging.info("ChatBotWithVectors initialized.")
 
-    def ask(self, query):
+    def _load_memory(self):
+        self.memory.clear()
+        for human, ai in self.chat_history.recent(self.memory_turns):
+            self.memory.save_context({'input': human}, {'output': ai})
+
+    def _use_subject(self, subject):
+        """Switch to the saved conversation of subject (None for the general chat)."""
+        if (subject or GENERAL_SUBJECT) != self.chat_history.subject:
+            self.chat_history = ChatHistoryStore(subject)
+            self._load_memory()
+            logging.info(f"Loaded {len(self.chat_history.turns)} saved turns for {self.chat_history.subject}.")
+
+    def _subjects(self, subject=None):
+        """Shards a question is routed to: its subject's plus the general one, or all of them for the general chat.
+
+        The general shard is searched too because lecture summaries indexed before sharding live there.
+        """
+        subject = subject or self.chat_history.subject
+        return None if subject == GENERAL_SUBJECT else [subject, GENERAL_SUBJECT]
+
+    def ask(self, query, subject=None):
+        with self.chat_lock:
+            self._use_subject(subject)
+            return self._ask(query)
+
+    def _prepare_query(self, query):
+        """Build the full query for ask(), trim memory to the token budget and derive the cache key."""
+        try:
+            # Query the vector store for relevant information (optional)
+            candidates = self.embedding_manager.query_embeddings_with_scores(query, k=self.retrieval_k,
+                                                                             subjects=self._subjects())
+            # Most relevant first: a lower FAISS distance means a closer match
+            relevant_texts = [text for text, _ in sorted(candidates, key=lambda c: c[1])]
+        except Exception as e:
+            logging.error(f"Error querying vector store: {e}")
+            relevant_texts = []
+
+        # Keep as many of the best chunks and latest turns as the token budget allows
+        history = self.chat_history.recent(self.memory_turns)
+        relevant_texts, history, usage = self.token_budget.fit(query, relevant_texts, history)
+        # Narrow the memory window to the turns that fit; the kept turns are always the newest
+        self.memory.k = len(history)
+        self.last_usage = usage
+        logging.info(f"Prompt tokens: {usage}")
+
+        full_query = self._full_query(query, relevant_texts)
+
+        # The reply depends on the conversation so far as well as the query
+        history_text = self.memory.load_memory_variables({}).get('history', '')
+        cache_key = self.llm_cache.make_key(self.model_name, full_query, history=history_text,
+                                            temperature=self.groq_chat.temperature)
+        return full_query, history_text, cache_key
+
+    def _semantic_partition(self):
+        """Semantic cache partition: the model and the subject, which decides the shards searched."""
+        return f"{self.model_name}|{self.chat_history.subject}"
+
+    def _cached_answer(self, query, cache_key):
+        """Return (answer or None, query vector for the semantic tier or None)."""
+        answer = self.llm_cache.get(cache_key)
+        query_vector = None
+        if answer is None and self.semantic_cache:
+            query_vector = self.embedding_manager.embeddings.embed_query(query)
+            answer = self.llm_cache.get_similar(self._semantic_partition(), query_vector)
+        return answer, query_vector
+
+    def _prompt(self, full_query, history_text):
+        """The prompt the conversation chain sends for full_query."""
+        return self.conversation.prompt.format(history=history_text, input=full_query)
+
+    def _finish_turn(self, query, answer, cache_key, query_vector, from_cache):
+        if not from_cache:
+            self.llm_cache.put(cache_key, self.model_name, answer)
+            if query_vector is not None:
+                self.llm_cache.put_similar(self._semantic_partition(), query_vector, answer)
+
+        # Memory keeps the bare question; retrieved context is looked up again for every query
+        self.memory.save_context({'input': query}, {'output': answer})
+        self.memory.k = self.memory_turns
+        messages = self.memory.chat_memory.messages
+        del messages[:-2 * self.memory_turns]
+
+        # Update chat history
+        self.chat_history.append(query, answer)
+        logging.info(f"Response generated: {answer}".strip())
+
+    def _ask(self, query):
         try:
             logging.info(f"Received query: {query}")
+            full_query, history_text, cache_key = self._prepare_query(query)
+            answer, query_vector = self._cached_answer(query, cache_key)
+            from_cache = answer is not None
+
+            if not from_cache:
+                # Get response from Groq
+                answer = self.groq_chat.invoke(self._prompt(full_query, history_text)).content
+
+            self._finish_turn(query, answer, cache_key, query_vector, from_cache)
+            return answer
+        except Exception as e:
+            logging.error(f"Error during query handling: {e}")
+            return f"An error occurred: {e}"
 
-            # Save chat history to memory
-            for message in self.chat_history:
-                self.memory.save_context({'input': message['human']}, {'output': message['AI']})
+    def ask_stream(self, query, cancel_event=None, subject=None):
+        """Like ask(), but yield the answer piece by piece; a cancelled answer is not kept in history."""
+        with self.chat_lock:
             try:
-                # Query the vector store for relevant information (optional)
-                relevant_texts = self.embedding_manager.query_embeddings(query, k=3)
+                self._use_subject(subject)
+                logging.info(f"Received streaming query: {query}")
+                full_query, history_text, cache_key = self._prepare_query(query)
+                answer, query_vector = self._cached_answer(query, cache_key)
+                if answer is not None:
+                    yield answer
+                    self._finish_turn(query, answer, cache_key, query_vector, True)
+                    return
 
-                if relevant_texts:
-                    # If relevant texts are found, include them in the full query
-                    full_query = f"User Query:\n{query}\nRelevant Information:\n" + "\n".join(relevant_texts)
-                else:
-                    # If no relevant texts found, proceed with the original query
-                    full_query = f"User Query:\n{query}"
+                pieces = []
+                for chunk in self.groq_chat.stream(self._prompt(full_query, history_text)):
+                    if cancel_event is not None and cancel_event.is_set():
+                        logging.info("Streaming answer cancelled.")
+                        return
+                    if chunk.content:
+                        pieces.append(chunk.content)
+                        yield chunk.content
 
+                answer = "".join(pieces)
+                self._finish_turn(query, answer, cache_key, query_vector, False)
             except Exception as e:
-                logging.error(f"Error querying vector store: {e}")
-                full_query = f"User Query:\n{query}"
+                logging.error(f"Error during streaming query handling: {e}")
+                yield f"An error occurred: {e}"
 
-            # Get response from Groq
-            conversation = ConversationChain(llm=self.groq_chat, memory=self.memory)
-            response = conversation(full_query)
+    def _full_query(self, query, relevant_texts):
+        if relevant_texts:
+            return f"User Query:\n{query}\nRelevant Information:\n" + "\n".join(relevant_texts)
+        return f"User Query:\n{query}"
 
-            # Update chat history
-            message = {'human': query, 'AI': response['response']}
-            self.chat_history.append(message)
+    def ask_many(self, queries, subject=None):
+        """Answer a list of independent questions (e.g. a revision sheet) and return answers in input order.
 
-            logging.info(f"Response generated: {response['response']}".strip())
-            return response['response']
+        Questions are retrieved for in one batch (from subject's and the general shard only, if given) and answered
+        concurrently without chat history; they are not added to the conversation.
+        """
+        started = time.perf_counter()
+        try:
+            candidates = self.embedding_manager.query_many_with_scores(queries, k=self.retrieval_k,
+                                                                       subjects=self._subjects(subject) if subject else None)
         except Exception as e:
-            logging.error(f"Error during query handling: {e}")
-            return f"An error occurred: {e}"
+            logging.error(f"Error querying vector store: {e}")
+            candidates = [[] for _ in queries]
+
+        prompts = []
+        for query, hits in zip(queries, candidates):
+            relevant_texts = [text for text, _ in sorted(hits, key=lambda c: c[1])]
+            relevant_texts, _, _ = self.token_budget.fit(query, relevant_texts, [])
+            prompt = self.conversation.prompt.format(history="", input=self._full_query(query, relevant_texts))
+            prompts.append(prompt)
+        retrieved = time.perf_counter()
 
-    def add_to_vector_store(self, texts):
+        def answer(prompt):
+            try:
+                return with_retries(self.complete, prompt, limiter=self.rate_limiter)
+            except Exception as e:
+                logging.error(f"Error answering batched query: {e}")
+                return f"An error occurred: {e}"
+
+        with ThreadPoolExecutor(max_workers=self.ask_many_concurrency) as pool:
+            answers = list(pool.map(answer, prompts))
+
+        elapsed = time.perf_counter() - started
+        self.last_batch_stats = {
+            "questions": len(queries),
+            "retrieval_seconds": round(retrieved - started, 3),
+            "total_seconds": round(elapsed, 3),
+            "questions_per_second": round(len(queries) / elapsed, 2) if elapsed else 0.0,
+            "errors": sum(a.startswith("An error occurred") for a in answers),
+        }
+        logging.info(f"ask_many: {self.last_batch_stats}")
+        return answers
+
+    def add_to_vector_store(self, texts, subject=None, metadata=None):
         try:
             logging.info("Adding texts to vector store.")
-            self.embedding_manager.create_embeddings(texts)
+            self.embedding_manager.create_embeddings(texts, subject, metadata)
             logging.info("Texts added to vector store successfully.")
         except Exception as e:
             logging.error(f"Error adding texts to vector store: {e}")
             return f"An error occurred while adding to vector store: {e}"
 
-    def summarize(self, input_file, output_file):
+    def summarize(self, input_file, output_file, index=True):
         try:
             logging.info(f"Starting summarization for file: {input_file}")
 
             with open(input_file, "r") as f:
                 text = f.read()
 
-            # Create a summarization query
-            summary_prompt = f"Summarize the following text:\n{text}"
-            key_points_prompt = f"Extract key points of the following text:\n{text}"
-
-            # Use Groq API to get the summary
-            conversation = ConversationChain(llm=self.groq_chat)
-            response = conversation.run(summary_prompt)
-            response_key_points = conversation.run(key_points_prompt)
+            if count_tokens(text) > self.summary_chunk_tokens:
+                sections = self.map_reduce_summary(text)
+            else:
+                sections = self.structured_summary(text)
 
-            summary_text = response if isinstance(response, str) else response.get('response', '')
-            key_points_text = response_key_points if isinstance(response_key_points, str) else response_key_points.get('response', '')
+            summary_text = sections["summary"]
+            key_points_text = sections["key_points"]
             self.keypoints=key_points_text
             max_words_per_line = 20  # Maximum words per line
             words = summary_text.split()
@@ -118,9 +307,13 @@ class ChatBotWithVectors:
                 f.write("\n\nKEY POINTS\n")
                 for line in key_points_text.split('\n'):
                     f.write(line + "\n")
+                for title, key in (("HOMEWORK", "homework"), ("QUESTIONS AND ANSWERS", "qa")):
+                    if sections[key]:
+                        f.write(f"\n\n{title}\n{sections[key]}\n")
 
-            # Add the summary to the vector store
-            self.add_to_vector_store([summary_text])
+            # Add the summary to the vector store (the lecture pipeline does this as its own stage)
+            if index:
+                self.add_to_vector_store([summary_text])
 
             logging.info(f"Summarization completed. Output saved to: {output_file}")
             return output_file
@@ -128,9 +321,86 @@ class ChatBotWithVectors:
             logging.error(f"Error during summarization: {e}")
             return f"An error occurred during summarization: {e}"
 
+    def complete(self, prompt, json_mode=False, parse=None):
+        """Send one stateless prompt to Groq, or answer it from the cache, and return the reply.
+
+        parse, if given, converts the reply; a reply it rejects is not cached.
+        """
+        key = self.llm_cache.make_key(self.model_name, prompt, json_mode=json_mode,
+                                      temperature=self.groq_chat.temperature)
+        reply = self.llm_cache.get(key)
+        cached = reply is not None
+        if not cached:
+            llm = self.groq_chat.bind(response_format={"type": "json_object"}) if json_mode else self.groq_chat
+            reply = llm.invoke(prompt).content
+        result = parse(reply) if parse else reply
+        if not cached:
+            self.llm_cache.put(key, self.model_name, reply)
+        return result
+
+    def complete_many(self, prompts):
+        """Send prompts concurrently, at most summary_concurrency at a time, keeping their order."""
+        with ThreadPoolExecutor(max_workers=self.summary_concurrency) as pool:
+            return list(pool.map(self.complete, prompts))
+
+    def structured_summary(self, text, source="text"):
+        """Get summary, key points, homework and Q&A in one JSON request, or two parallel ones on failure."""
+        def parse(reply):
+            sections = json.loads(reply[reply.find("{"):reply.rfind("}") + 1])
+            result = {key: _as_text(sections.get(key)) for key in ("summary", "key_points", "homework", "qa")}
+            if not result["summary"]:
+                raise ValueError("reply has no summary")
+            return result
+
+        try:
+            return self.complete(STRUCTURED_SUMMARY_PROMPT.format(source=source, text=text), json_mode=True, parse=parse)
+        except Exception as e:
+            logging.warning(f"Single-request summary failed, falling back to two requests: {e}")
+
+        summary_text, key_points_text = self.complete_many([
+            f"Summarize the following {source}:\n{text}",
+            f"Extract key points of the following {source}:\n{text}",
+        ])
+        return {"summary": summary_text, "key_points": key_points_text, "homework": "", "qa": ""}
+
+    def map_reduce_summary(self, text):
+        """Summarize a long transcript chunk by chunk in parallel, then merge the partial summaries."""
+        chunks = split_by_tokens(text, self.summary_chunk_tokens)
+        logging.info(f"Map-reduce summarization over {len(chunks)} chunks.")
+        partials = self.complete_many([
+            f"Summarize part {i} of {len(chunks)} of a lecture transcript. List its key points, "
+            f"any homework mentioned and any student questions with their answers:\n{chunk}"
+            for i, chunk in enumerate(chunks, start=1)
+        ])
+
+        # Merge partial summaries in groups until they all fit in one request
+        while len(partials) > 1 and count_tokens("\n\n".join(partials)) > self.summary_chunk_tokens:
+            groups = pack_by_tokens([(p, count_tokens(p)) for p in partials], self.summary_chunk_tokens)
+            if len(groups) == len(partials):
+                break  # Each partial fills a request on its own, merging cannot shrink them further
+            partials = self.complete_many([
+                "Merge these summaries of consecutive parts of one lecture into one summary, keeping "
+                "its key points, homework and student questions with answers:\n" + "\n\n".join(group)
+                for group in groups
+            ])
+
+        combined = "\n\n".join(partials)
+        return self.structured_summary(combined, source="summaries of consecutive parts of one lecture")
+
+_shared_bot = None
+_shared_lock = threading.Lock()
+
+def get_shared_bot():
+    """Return the process-wide ChatBotWithVectors, creating it on first use."""
+    global _shared_bot
+    with _shared_lock:
+        if _shared_bot is None:
+            _shared_bot = ChatBotWithVectors()
+        return _shared_bot
+
 # Example usage
 if __name__ == "__main__":
-    chatbot = ChatBotWithVectors()
+    chatbot = get_shared_bot()
 
     print("Chatbot is ready! Type 'exit' to quit.")
 
@@ -139,7 +409,8 @@ if __name__ == "__main__":
         print("1: Ask a question")
         print("2: Add texts to vector store")
         print("3: Summarize a text file")
-        print("4: Exit")
+        print("4: Answer a file of questions (one per line)")
+        print("5: Exit")
 
         choice = input("Choose an option: ")
         if choice == '1':
@@ -166,6 +437,13 @@ if __name__ == "__main__":
             result = chatbot.summarize(file_path, output_path)
             print(f"Summary saved to: {result}" if not result.startswith("An error occurred") else result)
         elif choice == '4':
+            file_path = input("Enter the path of the questions file: ")
+            with open(file_path, "r") as f:
+                questions = [line.strip() for line in f if line.strip()]
+            for question, answer in zip(questions, chatbot.ask_many(questions)):
+                print(f"\nQ: {question}\nA: {answer}")
+            print(f"\n{chatbot.last_batch_stats}")
+        elif choice == '5':
             print("Goodbye!")
             logging.info("Chatbot session ended.")
             break
@@ -1,21 +1,36 @@
 from datetime import datetime
+from enum import Enum
+import queue
 import threading
+import time
 import os
-import whisper
 import logging
 import wave
 import pyaudio
-from src.PhineasBot import ChatBotWithVectors
+from src.PhineasBot import get_shared_bot
+from src.audiostream import WavSpooler, WhisperFeed
+from src.livetranscribe import LiveTranscriber, append_transcript, transcribe_array, transcribe_file
+from src.whisper_registry import get_model
+from src.transcript_cache import TranscriptCache
+from src.transcript_store import TranscriptStore
+from src.pipeline import LecturePipeline
+
+class CaptureState(Enum):
+    IDLE = "idle"
+    RECORDING = "recording"
+    PAUSED = "paused"
+    STOPPING = "stopping"
 
 class Phineas_AI:
 
-    def __init__(self):
-        self.whisper_model = whisper.load_model("base")
-        self.transcribing = False
-        self.paused = False
-        self.transcription_thread = None
+    def __init__(self, rate=44100):
+        self.whisper_model_name = None  # None uses PHINEAS_WHISPER_MODEL or the hardware probe
+        self.state = CaptureState.IDLE
+        self.transcription_thread = None  # Reads the microphone
+        self.consumer_thread = None  # Writes captured audio to the spool, feed and live transcriber
         self.transcription_result = ""
         self.transcription_filename = ""
+        self.segments_filename = ""  # Timestamped segments of the same lecture, see TranscriptStore
 
         self.subname = None
         self.foldertrans = None
@@ -25,14 +40,28 @@ class Phineas_AI:
         self.vector_store = None
 
         self.CHUNK = 4096  # Buffer size
+        self.QUEUE_CHUNKS = 64  # Captured chunks allowed to wait for the consumer (~6s at 44.1 kHz)
+        self.QUEUE_TIMEOUT = 1.0  # Seconds the capture thread blocks on a full queue before dropping a chunk
+        self.audio_queue = None
+        self.dropped_chunks = 0
         self.FORMAT = pyaudio.paInt16  # Audio format
         self.CHANNELS = 1
-        self.RATE = 44100
+        self.RATE = rate  # Pass 16000 to capture at Whisper's native rate and skip resampling
         self.frames = []
+        self.spool_audio = True  # Write audio to disk while recording instead of keeping it in self.frames
+        self.spooler = None
+        self.direct_whisper = True  # Hand Whisper float32 arrays instead of a file path it decodes with ffmpeg
+        self.feed = None
+        # Transcribe windows of audio on a worker thread while recording, so Stop only flushes the last one
+        self.live_transcription = os.getenv("PHINEAS_LIVE_TRANSCRIPTION", "1").lower() not in ("0", "false", "no")
+        self.live = None
+        self.skip_silence = True  # Cut dead air out of the audio before it reaches Whisper
+        self.transcript_cache = TranscriptCache()  # Re-transcribing the same audio is a file read
         self.audio = pyaudio.PyAudio()
         stream = None
 
         self.lock = threading.Lock()
+        self.state_changed = threading.Condition(self.lock)
         self.initialize_folders()
         
 
@@ -51,11 +80,38 @@ class Phineas_AI:
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
 
+        # Post-lecture work runs in the background and resumes after a crash or restart
+        self.pipeline = LecturePipeline({
+            "save": self.save_stage,
+            "transcribe": self.transcribe_stage,
+            "summarize": self.summarize_stage,
+            "index": self.index_stage,
+        })
+        self.pipeline.resume()
+
     def initialize_folders(self):
         base_path = os.path.join("Phineas_AI", "Records")
         if not os.path.exists(base_path):
             os.makedirs(base_path)
 
+    @property
+    def whisper_model(self):
+        # Loaded on first use and shared with every other user of the registry
+        return get_model(self.whisper_model_name)
+
+    @property
+    def transcribing(self):
+        return self.state in (CaptureState.RECORDING, CaptureState.PAUSED)
+
+    @property
+    def paused(self):
+        return self.state is CaptureState.PAUSED
+
+    def set_state(self, state):
+        with self.state_changed:
+            self.state = state
+            self.state_changed.notify_all()
+
     def create_subfolders(self):
         self.foldertrans = os.path.join("Phineas_AI", "Records", self.subname, "Transcript_Folder")
         self.foldersum = os.path.join("Phineas_AI", "Records", self.subname, "Summary_Folder")
@@ -67,125 +123,240 @@ class Phineas_AI:
                 os.makedirs(folder)
 
     def start_transcription(self, subname):
+        with self.lock:
+            if self.state is not CaptureState.IDLE:
+                logging.info("Transcription is already in progress.")
+                return
+            self.state = CaptureState.RECORDING
+
         self.subname = subname
         self.create_subfolders()
 
-        if self.transcribing:
-            logging.info("Transcription is already in progress.")
-            return
-
-        timestamp = datetime.now().strftime("-%Y-%m-%d_%I-%M-%p")
-        self.transcription_filename = f"{self.foldertrans}/{self.subname}{timestamp}.txt"
-        self.transcribing = True
-        self.paused = False
+        self.timestamp = datetime.now().strftime("-%Y-%m-%d_%I-%M-%p")
+        self.transcription_filename = f"{self.foldertrans}/{self.subname}{self.timestamp}.txt"
+        self.segments_filename = f"{self.foldertrans}/{self.subname}{self.timestamp}.jsonl"
+        self.audiofilename = f"{self.folderaudio}/{self.subname}_{self.timestamp}.wav"
+        self.frames = []
+        self.feed = None
+        if self.live_transcription:
+            self.live = LiveTranscriber(self.whisper_model, self.transcription_filename, self.RATE,
+                                        skip_silence=self.skip_silence,
+                                        store=TranscriptStore(self.segments_filename))
+            self.live.start()
+        if self.spool_audio:
+            self.open_spooler()
+        elif self.direct_whisper and not self.live:
+            # Without a spool file, resample to 16 kHz while recording
+            self.feed = WhisperFeed(self.RATE)
         self.transcription_result = ""
+        self.audio_queue = queue.Queue(maxsize=self.QUEUE_CHUNKS)
+        self.dropped_chunks = 0
 
         logging.info("Starting transcription...")
-        self.transcription_thread = threading.Thread(target=self._transcribe_audio)
+        self.consumer_thread = threading.Thread(target=self.consume_audio)
+        self.consumer_thread.start()
+        self.transcription_thread = threading.Thread(target=self.listen)
         self.transcription_thread.start()
 
     def listen(self):
-        if not self.paused:
-            logging.info("Listening...")
+        logging.info("Listening...")
+        stream = None
+        try:
+            # One stream for the whole lecture, pausing only stops and restarts it
+            stream = self.audio.open(
+                format=self.FORMAT,
+                channels=self.CHANNELS,
+                rate=self.RATE,
+                input=True,
+                frames_per_buffer=self.CHUNK
+            )
+            while self.wait_while_paused(stream):
+                try:
+                    data = stream.read(self.CHUNK, exception_on_overflow=False)
+                except OSError as e:
+                    print(f"Warning: {e}")
+                    time.sleep(0.1)
+                    continue
+                self.enqueue_frames(data)
+        except Exception as e:
+            print(f"Error in recording: {e}")
+            logging.error(f"Error in recording: {e}")
+        finally:
+            if stream:
+                try:
+                    stream.stop_stream()
+                    stream.close()
+                except Exception:
+                    pass
+            self.audio_queue.put(None)  # Tells the consumer the recording is over
+
+    def wait_while_paused(self, stream):
+        """Block without polling while paused; return True while the stream should be read."""
+        with self.state_changed:
+            if self.state is CaptureState.PAUSED:
+                stream.stop_stream()
+                while self.state is CaptureState.PAUSED:
+                    self.state_changed.wait()
+                if self.state is CaptureState.RECORDING:
+                    stream.start_stream()
+            return self.state is CaptureState.RECORDING
+
+    def enqueue_frames(self, data):
+        try:
+            # Blocks when the consumer falls behind, so the queue never holds more than QUEUE_CHUNKS
+            self.audio_queue.put(data, timeout=self.QUEUE_TIMEOUT)
+        except queue.Full:
+            self.dropped_chunks += 1
+            logging.warning(f"Audio consumer is falling behind, dropped {self.dropped_chunks} chunk(s).")
+
+    def consume_audio(self):
+        while True:
+            data = self.audio_queue.get()
+            if data is None:
+                break
             try:
-                
-                stream = self.audio.open(
-                    format=self.FORMAT,
-                    channels=self.CHANNELS,
-                    rate=self.RATE,
-                    input=True,
-                    frames_per_buffer=self.CHUNK
-                )
-                while self.transcribing:
-                    try:
-                        data = stream.read(self.CHUNK, exception_on_overflow=False)
-                        self.frames.append(data)
-                    except OSError as e:
-                        print(f"Warning: {e}")
-                        time.sleep(0.1)
-                        continue
+                self.store_frames(data)
             except Exception as e:
-                print(f"Error in recording: {e}")
-            finally:
-                if stream:
-                    try:
-                        stream.stop_stream()
-                        stream.close()
-                    except:
-                        pass
-                self.transcribing = False
-
-    def save_audio_chunk(self):
-        if not self.frames:
-            return
-        try:
-            self.timestamp = datetime.now().strftime("-%Y-%m-%d_%I-%M-%p")
-            # Use a fixed filename for the entire recording
-            self.audiofilename = f"{self.folderaudio}/{self.subname}_{self.timestamp}.wav"
-            with wave.open(self.audiofilename, 'wb') as wf:
+                logging.error(f"Error storing audio: {e}")
+
+    def open_spooler(self):
+        self.spooler = WavSpooler(
+            self.audiofilename,
+            channels=self.CHANNELS,
+            sampwidth=self.audio.get_sample_size(self.FORMAT),
+            rate=self.RATE
+        )
+
+    def store_frames(self, data):
+        if self.spooler:
+            self.spooler.write(data)
+        else:
+            self.frames.append(data)
+        if self.feed:
+            self.feed.write(data)
+        if self.live:
+            self.live.feed(data)
+
+    def run_whisper(self, audio):
+        if not self.direct_whisper:
+            return self.whisper_model.transcribe(audio)
+        return transcribe_array(self.whisper_model, audio, self.skip_silence, cache=self.transcript_cache)
+
+    def save_stage(self, job, runtime):
+        spooler, frames = runtime.get("spooler"), runtime.get("frames")
+        if spooler:
+            # The audio is already on disk, only the buffered tail needs writing
+            spooler.close()
+        elif frames:
+            with wave.open(job["audio"], 'wb') as wf:
                 wf.setnchannels(self.CHANNELS)
                 wf.setsampwidth(self.audio.get_sample_size(self.FORMAT))
                 wf.setframerate(self.RATE)
-                wf.writeframes(b''.join(self.frames))
-        except Exception as e:
-            print(f"Error in saving recording: {e}")
-        logging.info(f"Audio has been saved to '{self.audiofilename}'.")
+                wf.writeframes(b''.join(frames))
+        elif not os.path.exists(job["audio"]):
+            logging.warning("Nothing was recorded.")
+            job["empty"] = True
+            return
+        logging.info(f"Audio has been saved to '{job['audio']}'.")
 
-    def transcribe(self):
-        try:
-            # Use Whisper to transcribe the audio file
-            logging.info(f"Transcribing audio using Whisper: {self.audiofilename}")
-            result = self.whisper_model.transcribe(self.audiofilename)
-            self.transcription_result = result["text"]
+    def transcribe_stage(self, job, runtime):
+        if job.get("empty"):
+            return
+        # Kept in a local: start_transcription resets self.transcription_result on the UI thread
+        live, feed = runtime.get("live"), runtime.get("feed")
+        if live:
+            # Most of the lecture was transcribed while recording, only the last window is left
+            logging.info("Flushing live transcription...")
+            live.stop()
+            text = live.text
+        else:
+            # Start from empty files so a resumed job never appends a second copy
+            for path in (job["transcript"], job["segments"], job["segments"] + ".idx"):
+                if os.path.exists(path):
+                    os.remove(path)
 
-        except Exception as e:
-            logging.error(f"An error occurred with Whisper transcription: {e}")
-
-        if self.transcription_result:
-            # Split the text into lines based on a fixed number of words
-            max_words_per_line = 10  # Maximum words per line
-            words = self.transcription_result.split()
-            lines = [' '.join(words[i:i + max_words_per_line]) 
-                     for i in range(0, len(words), max_words_per_line)]
-
-            with open(self.transcription_filename, "a") as f:  # Append to the file instead of overwriting
-                for line in lines:
-                    f.write(line + "\n")  # Write each line with a newline character
-
-            logging.info(f"Transcript saved to {self.transcription_filename}")
-            output_file = f"{self.foldersum}/{self.subname}_Summary_{self.timestamp}.txt"
-            self.bot=ChatBotWithVectors()
-            self.bot.summarize(self.transcription_filename,output_file)
+            # Use Whisper to transcribe the audio file
+            logging.info(f"Transcribing audio using Whisper: {job['audio']}")
+            if feed:
+                result = self.run_whisper(feed.samples())
+            elif self.direct_whisper:
+                # The cache is checked against the WAV's bytes before the file is decoded and resampled
+                result = transcribe_file(self.whisper_model, job["audio"], self.skip_silence,
+                                         cache=self.transcript_cache)
+            else:
+                result = self.run_whisper(job["audio"])
+            text = result["text"]
+            TranscriptStore(job["segments"]).append(result.get("segments", []))
+            if text:
+                append_transcript(job["transcript"], text)
+
+        if text.strip():
+            logging.info(f"Transcript saved to {job['transcript']}")
         else:
             logging.warning("No transcription result to save.")
+            job["empty"] = True
 
+    def summarize_stage(self, job, runtime):
+        if job.get("empty"):
+            return
+        self.bot=get_shared_bot()
+        result = self.bot.summarize(job["transcript"], job["summary"], index=False)
+        if result != job["summary"]:
+            raise RuntimeError(result)
 
-    def _transcribe_audio(self):
-        while self.transcribing:
-            if not self.paused:
-                self.listen()
+    def index_stage(self, job, runtime):
+        if job.get("empty"):
+            return
+        with open(job["summary"], "r") as f:
+            summary_text = f.read().split("\n\nKEY POINTS\n")[0]
+        self.bot=get_shared_bot()
+        metadata = {"date": datetime.fromtimestamp(job["created"]).strftime("%Y-%m-%d"), "source": "summary"}
+        error = self.bot.add_to_vector_store([summary_text], job["subject"], metadata)
+        if error:
+            raise RuntimeError(error)
 
     def pause_transcription(self):
-        with self.lock:
-            if not self.paused:
-                if self.transcribing:
-                    self.paused = True
-                    logging.info("Transcription paused.")
-            else:
-                if self.transcribing and self.paused:
-                    self.paused = False
-                    logging.info("Transcription resumed.")
+        with self.state_changed:
+            if self.state is CaptureState.RECORDING:
+                self.state = CaptureState.PAUSED
+                logging.info("Transcription paused.")
+            elif self.state is CaptureState.PAUSED:
+                self.state = CaptureState.RECORDING
+                logging.info("Transcription resumed.")
+            self.state_changed.notify_all()
+
+    def resume_transcription(self):
+        with self.state_changed:
+            if self.state is CaptureState.PAUSED:
+                self.state = CaptureState.RECORDING
+                self.state_changed.notify_all()
+                logging.info("Transcription resumed.")
 
     def stop_transcription(self):
-        with self.lock:
-            if self.transcribing:
-                self.transcribing = False
-                logging.info("Transcription stopped.")
-                if self.transcription_thread and self.transcription_thread.is_alive():
-                    self.transcription_thread.join()
-        self.save_audio_chunk()
-        self.transcribe()
-        
+        with self.state_changed:
+            if not self.transcribing:
+                logging.info("No transcription in progress.")
+                return
+            self.state = CaptureState.STOPPING
+            self.state_changed.notify_all()
+            logging.info("Transcription stopped.")
+        for thread in (self.transcription_thread, self.consumer_thread):
+            if thread and thread.is_alive():
+                thread.join()
+
+        # Hand the recording to the background pipeline so the UI is free straight away
+        runtime = {"spooler": self.spooler, "frames": self.frames, "feed": self.feed, "live": self.live}
+        self.pipeline.submit(
+            runtime,
+            subject=self.subname,
+            audio=self.audiofilename,
+            transcript=self.transcription_filename,
+            segments=self.segments_filename,
+            summary=f"{self.foldersum}/{self.subname}_Summary_{self.timestamp}.txt"
+        )
+        self.spooler, self.frames, self.feed, self.live = None, [], None, None
+        self.set_state(CaptureState.IDLE)
+
     def openrepo(self):
         path = self.foldersum
         os.startfile(path)
@@ -197,7 +368,6 @@ if __name__ == "__main__":
     # Start transcription
     helper.start_transcription("Subject_Name")
 
-    import time
     time.sleep(10)  # Simulate 10 seconds of transcription
 
     # Pause transcription
@@ -211,6 +381,3 @@ if __name__ == "__main__":
 
     # Stop transcription
     helper.stop_transcription()
-
-    # Stop transcription
-    helper.stop_transcription()
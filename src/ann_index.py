@@ -0,0 +1,128 @@
+import argparse
+import logging
+import math
+import os
+import time
+import faiss
+import numpy as np
+
+INDEX_TYPES = ["flat", "hnsw", "ivf_flat", "ivf_pq"]
+
+# (minimum vector count, index type), checked from the largest; override per shard via IndexShard.thresholds
+DEFAULT_THRESHOLDS = [(0, "flat"), (10000, "hnsw"), (100000, "ivf_flat"), (1000000, "ivf_pq")]
+
+HNSW_M = 32  # Graph neighbours per node
+HNSW_EF_CONSTRUCTION = 40
+HNSW_EF_SEARCH = 64
+PQ_BITS = 8  # Bits per sub-quantizer code
+
+
+def choose_index_type(count, thresholds=DEFAULT_THRESHOLDS):
+    """Index type for a shard holding count vectors."""
+    for minimum, kind in sorted(thresholds, reverse=True):
+        if count >= minimum:
+            return kind
+    return "flat"
+
+
+def index_type(index):
+    """Name of the INDEX_TYPES entry a FAISS index was built as."""
+    if isinstance(index, faiss.IndexHNSWFlat):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    return "flat"
+
+
+def _nlist(count):
+    # About 4 * sqrt(n) lists, but at least 39 training points per list as FAISS recommends
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+def _pq_subquantizers(dim):
+    return next(m for m in (16, 12, 8, 6, 4, 2, 1) if dim % m == 0)
+
+
+def build_index(kind, vectors):
+    """Build a FAISS index of the given type, trained on and holding vectors (ids 0..n-1)."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif kind in ("ivf_flat", "ivf_pq"):
+        nlist = _nlist(count)
+        quantizer = faiss.IndexFlatL2(dim)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), PQ_BITS)
+        index.train(vectors)
+        index.nprobe = max(1, nlist // 16)
+    else:
+        raise ValueError(f"Unknown index type '{kind}', expected one of {INDEX_TYPES}.")
+    index.add(vectors)
+    return index
+
+
+def benchmark(vectors, kinds=INDEX_TYPES, k=5, queries=200, seed=0):
+    """Compare index types on vectors: recall@k against flat search, p50/p99 latency and bytes per vector."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    # Queries are stored vectors with a little noise, like questions close to something in the notes
+    picks = rng.choice(len(vectors), size=min(queries, len(vectors)), replace=False)
+    noise = rng.normal(scale=vectors.std() * 0.1, size=(len(picks), vectors.shape[1]))
+    query_vectors = (vectors[picks] + noise).astype(np.float32)
+
+    _, truth = build_index("flat", vectors).search(query_vectors, k)
+    results = {}
+    for kind in kinds:
+        started = time.perf_counter()
+        index = build_index(kind, vectors)
+        build_seconds = time.perf_counter() - started
+
+        latencies, hits = [], 0
+        for query, expected in zip(query_vectors, truth):
+            started = time.perf_counter()
+            _, found = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(set(found[0]) & set(expected))
+
+        results[kind] = {
+            "recall": hits / (len(query_vectors) * k),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "bytes_per_vector": len(faiss.serialize_index(index)) / len(vectors),
+            "build_seconds": build_seconds,
+        }
+        row = results[kind]
+        print(f"{kind:>8}: recall@{k} {row['recall']:.3f} | p50 {row['p50_ms']:.3f} ms | "
+              f"p99 {row['p99_ms']:.3f} ms | {row['bytes_per_vector']:.0f} B/vector | build {build_seconds:.1f}s")
+    logging.info(f"ANN benchmark over {len(vectors)} vectors: {results}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare FAISS index types on a subject's vectors.")
+    parser.add_argument("--subject", help="Shard to benchmark (default: the general index)")
+    parser.add_argument("--synthetic", type=int, help="Benchmark this many random vectors instead")
+    parser.add_argument("--dim", type=int, default=96, help="Dimension of synthetic vectors")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--types", nargs="+", default=INDEX_TYPES, help="Index types to compare")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        data = np.random.default_rng(1).normal(size=(args.synthetic, args.dim)).astype(np.float32)
+    else:
+        from src.vectorstoreai import EmbeddingManager
+        manager = EmbeddingManager()
+        # Run from the command line, so vectors missing from the embedding cache can use worker processes
+        manager.embeddings.n_process = min(os.cpu_count() or 1, 4)
+        data = manager.shard(args.subject).vectors()
+    benchmark(data, args.types, args.k, args.queries)
@@ -0,0 +1,205 @@
+import logging
+import math
+import os
+import struct
+import time
+import wave
+import numpy as np
+
+WHISPER_RATE = 16000  # Whisper models expect 16 kHz mono float32 input
+
+
+def pcm16_to_float32(data):
+    """Convert little-endian int16 PCM bytes to float32 samples in [-1, 1)."""
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+class Resampler:
+    """Streaming polyphase resampler with a Kaiser-windowed sinc low-pass, keeping state across chunks.
+
+    The filter removes content above half the lower of the two rates, so going from 44.1 kHz to 16 kHz
+    does not fold 8-22 kHz content back into the speech band.
+    """
+
+    def __init__(self, src_rate, dst_rate=WHISPER_RATE, attenuation_db=80.0):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        divisor = math.gcd(src_rate, dst_rate)
+        self.up, self.down = dst_rate // divisor, src_rate // divisor  # 160 and 441 for 44.1 kHz -> 16 kHz
+
+        # Pass band up to 7/16 of the lower rate, stop band from 9/16 of it: everything that folds into
+        # the pass band is attenuated by attenuation_db
+        nyquist = min(src_rate, dst_rate) / 2
+        transition = nyquist / 4
+        taps = int(np.ceil((attenuation_db - 7.95) / (2.285 * 2 * np.pi * transition / src_rate))) | 1
+        beta = 0.1102 * (attenuation_db - 8.7)
+        # Designed at the upsampled rate and split into self.up phases. The centre sits a whole number of
+        # output samples in, so output n lines up exactly with input time n / dst_rate
+        center = -(-(taps * self.up - 1) // 2 // self.down) * self.down
+        length = -(-(2 * center + 1) // self.up) * self.up
+        n = np.arange(length) - center
+        cutoff = nyquist / (src_rate * self.up)  # Cycles per upsampled sample
+        window = np.concatenate((np.kaiser(2 * center + 1, beta), np.zeros(length - 2 * center - 1)))
+        h = 2 * cutoff * np.sinc(2 * cutoff * n) * window * self.up
+        self._taps = length // self.up
+        self._phases = h.reshape(self._taps, self.up).T[:, ::-1].astype(np.float32)  # [phase, tap], oldest first
+        self._skip = center // self.down  # Outputs that only cover the filter's delay, never returned
+
+        self._history = np.zeros(self._taps - 1, dtype=np.float32)  # Input samples the next outputs still need
+        self._first = -(self._taps - 1)  # Input index of _history[0]; starts as zero padding before the signal
+        self._next = self._skip  # Index of the next output sample, counting the skipped ones
+
+    def process(self, samples):
+        """Resample a chunk of float32 samples, returning whatever output is ready."""
+        if self.src_rate == self.dst_rate:
+            return samples
+        x = np.concatenate((self._history, np.asarray(samples, dtype=np.float32)))
+        last = self._first + len(x) - 1  # Input index of the newest sample
+
+        # Output n sits at upsampled position n * down; its newest input sample is (n * down) // up
+        stop = ((last + 1) * self.up - 1) // self.down + 1
+        count = max(stop - self._next, 0)
+        # windows[i] holds the taps ending at input i + taps - 1, oldest first, without copying x
+        windows = np.lib.stride_tricks.sliding_window_view(x, self._taps)
+        if count < 4 * self.up:
+            # A capture chunk: gathering its few (outputs x taps) windows beats a loop over the phases
+            positions = np.arange(self._next, stop) * self.down
+            starts = positions // self.up - self._first - (self._taps - 1)
+            out = np.einsum("ij,ij->i", windows[starts], self._phases[positions % self.up]).astype(np.float32)
+        else:
+            # Outputs up apart share a phase and their windows start down inputs apart: one strided
+            # matrix-vector product per phase, with nothing the size of outputs x taps in memory
+            out = np.empty(count, dtype=np.float32)
+            for k in range(self.up):
+                position = (self._next + k) * self.down
+                first = position // self.up - self._first - (self._taps - 1)
+                rows = len(range(k, count, self.up))
+                phase = self._phases[position % self.up]
+                out[k::self.up] = windows[first:first + (rows - 1) * self.down + 1:self.down] @ phase
+        self._next += count
+
+        keep_from = (self._next * self.down) // self.up - self._first - (self._taps - 1)
+        keep_from = min(max(keep_from, 0), len(x))
+        self._history = x[keep_from:]
+        self._first += keep_from
+        return out
+
+
+class WhisperFeed:
+    """Collect captured PCM chunks as 16 kHz float32 audio ready to pass to Whisper."""
+
+    def __init__(self, capture_rate):
+        self.resampler = Resampler(capture_rate, WHISPER_RATE)
+        self._chunks = []
+        self.num_samples = 0
+
+    def write(self, data):
+        """Resample one int16 PCM chunk as it arrives."""
+        samples = self.resampler.process(pcm16_to_float32(data))
+        if len(samples):
+            self._chunks.append(samples)
+            self.num_samples += len(samples)
+
+    def samples(self):
+        """Return everything written so far as one contiguous float32 array."""
+        if not self._chunks:
+            return np.zeros(0, dtype=np.float32)
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0]
+
+
+def read_wav_float32(filename, block_seconds=5):
+    """Read a 16-bit PCM WAV file as 16 kHz mono float32 without going through ffmpeg."""
+    with wave.open(filename, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"Unsupported sample width {wf.getsampwidth()} in '{filename}'")
+        channels = wf.getnchannels()
+        resampler = Resampler(wf.getframerate(), WHISPER_RATE)
+        block_frames = wf.getframerate() * block_seconds
+        chunks = []
+        # Decode block by block so the int16 and float32 copies of the whole file never coexist
+        while True:
+            data = wf.readframes(block_frames)
+            if not data:
+                break
+            samples = pcm16_to_float32(data)
+            if channels > 1:
+                samples = samples.reshape(-1, channels).mean(axis=1)
+            chunks.append(resampler.process(samples))
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks)
+
+
+class WavSpooler:
+    """Write PCM audio to a WAV file as it is captured, keeping the header valid on disk."""
+
+    HEADER_SIZE = 44
+
+    def __init__(self, filename, channels, sampwidth, rate, buffer_bytes=64 * 1024, sync_interval=5.0):
+        self.filename = filename
+        self.channels = channels
+        self.sampwidth = sampwidth
+        self.rate = rate
+        self.buffer_bytes = buffer_bytes  # Audio is held in RAM only up to this size
+        self.sync_interval = sync_interval  # Seconds between fsync calls
+
+        self.data_bytes = 0
+        self._buffer = bytearray()
+        self._last_sync = time.monotonic()
+
+        self._file = open(self.filename, "wb")
+        self._write_header()
+        logging.info(f"Spooling audio to '{self.filename}'.")
+
+    @property
+    def duration(self):
+        """Length of the audio written so far, in seconds."""
+        frames = (self.data_bytes + len(self._buffer)) // (self.channels * self.sampwidth)
+        return frames / self.rate
+
+    def _write_header(self):
+        """Write a RIFF/WAVE header describing the current data size."""
+        block_align = self.channels * self.sampwidth
+        header = struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF", 36 + self.data_bytes, b"WAVE",
+            b"fmt ", 16, 1, self.channels, self.rate, self.rate * block_align, block_align, self.sampwidth * 8,
+            b"data", self.data_bytes
+        )
+        self._file.seek(0)
+        self._file.write(header)
+
+    def write(self, data):
+        """Queue raw PCM bytes, flushing them to disk once the buffer is full."""
+        self._buffer.extend(data)
+        if len(self._buffer) >= self.buffer_bytes:
+            self.flush()
+
+    def flush(self):
+        """Append buffered audio to the file and patch the header so it is playable after a crash."""
+        if self._file is None:
+            return
+        if self._buffer:
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(self._buffer)
+            self.data_bytes += len(self._buffer)
+            self._buffer.clear()
+            self._write_header()
+        self._file.flush()
+
+        now = time.monotonic()
+        if now - self._last_sync >= self.sync_interval:
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+
+    def close(self):
+        """Flush the remaining audio and close the file."""
+        if self._file is None:
+            return
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        logging.info(f"Closed audio spool '{self.filename}' ({self.duration:.1f}s).")
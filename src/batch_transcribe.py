@@ -0,0 +1,162 @@
+import argparse
+import json
+import logging
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.livetranscribe import append_transcript, transcribe_file
+from src.transcript_store import TranscriptStore
+
+RECORDS_DIR = os.path.join("Phineas_AI", "Records")
+MANIFEST_FILE = os.path.join("Phineas_AI", "Data", "Database", "batch_manifest.json")
+
+_worker_model = None  # Loaded once per worker process by _init_worker
+_worker_cache = None
+
+
+class Manifest:
+    """Record which audio files have been transcribed so an interrupted batch can resume."""
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.files = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self.files = json.load(f).get("files", {})
+
+    def is_done(self, audio_path):
+        return self.files.get(audio_path, {}).get("status") == "done"
+
+    def update(self, audio_path, **entry):
+        self.files[audio_path] = entry
+        self.save()
+
+    def save(self):
+        """Write the manifest atomically so a killed run never leaves it half written."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def transcript_path_for(audio_path):
+    """Map Records/<subject>/Audio_Folder/x.wav to Records/<subject>/Transcript_Folder/x.txt."""
+    subject_dir = os.path.dirname(os.path.dirname(audio_path))
+    name = os.path.splitext(os.path.basename(audio_path))[0]
+    # The recorder names audio "<subject>_-<time>.wav" and its transcript "<subject>-<time>.txt"
+    name = name.replace("_-", "-", 1)
+    return os.path.join(subject_dir, "Transcript_Folder", f"{name}.txt")
+
+
+def find_untranscribed(records_dir, manifest):
+    """List (audio, transcript) paths for recordings that have no transcript yet."""
+    pending = []
+    if not os.path.isdir(records_dir):
+        return pending
+    for subject in sorted(os.listdir(records_dir)):
+        audio_dir = os.path.join(records_dir, subject, "Audio_Folder")
+        if not os.path.isdir(audio_dir):
+            continue
+        for name in sorted(os.listdir(audio_dir)):
+            if not name.lower().endswith(".wav"):
+                continue
+            audio_path = os.path.join(audio_dir, name)
+            transcript_path = transcript_path_for(audio_path)
+            if manifest.is_done(audio_path) or os.path.exists(transcript_path):
+                continue
+            pending.append((audio_path, transcript_path))
+    return pending
+
+
+def _init_worker(model_name, threads):
+    global _worker_model, _worker_cache
+    import torch
+    from src.transcript_cache import TranscriptCache
+    from src.whisper_registry import get_model
+    # Split the cores between workers instead of letting every worker use all of them
+    torch.set_num_threads(threads)
+    _worker_model = get_model(model_name)
+    _worker_cache = TranscriptCache()
+
+
+def _transcribe_file(audio_path, transcript_path, skip_silence):
+    start = time.perf_counter()
+    result = transcribe_file(_worker_model, audio_path, skip_silence, cache=_worker_cache)
+
+    os.makedirs(os.path.dirname(transcript_path), exist_ok=True)
+    segments_path = os.path.splitext(transcript_path)[0] + ".jsonl"
+    for path in (segments_path, segments_path + ".idx"):
+        if os.path.exists(path):
+            os.remove(path)  # Left over from a run killed before its transcript was written
+    TranscriptStore(segments_path).append(result.get("segments", []))
+
+    # Write next to the final name first so a killed worker never leaves a partial transcript
+    tmp_path = transcript_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    append_transcript(tmp_path, result["text"])
+    os.replace(tmp_path, transcript_path)
+
+    with wave.open(audio_path, "rb") as wf:
+        seconds = wf.getnframes() / wf.getframerate()
+    return seconds, time.perf_counter() - start
+
+
+def run_batch(records_dir=RECORDS_DIR, workers=None, model_name=None, skip_silence=True,
+              manifest_path=MANIFEST_FILE):
+    """Transcribe every untranscribed recording under records_dir on a process pool."""
+    manifest = Manifest(manifest_path)
+    pending = find_untranscribed(records_dir, manifest)
+    if not pending:
+        logging.info("Batch transcription: nothing to do.")
+        print("Nothing to transcribe.")
+        return manifest
+
+    from src.whisper_registry import registry
+    model_name = registry.resolve_name(model_name)
+    workers = workers or max(1, (os.cpu_count() or 1) // 2)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    logging.info(f"Batch transcription of {len(pending)} file(s) on {workers} worker(s).")
+    print(f"Transcribing {len(pending)} file(s) on {workers} worker(s)...")
+
+    done, audio_seconds = 0, 0.0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_name, threads)) as pool:
+        futures = {pool.submit(_transcribe_file, audio, transcript, skip_silence): (audio, transcript)
+                   for audio, transcript in pending}
+        for future in as_completed(futures):
+            audio_path, transcript_path = futures[future]
+            try:
+                seconds, elapsed = future.result()
+            except Exception as e:
+                logging.error(f"Batch transcription failed for {audio_path}: {e}")
+                manifest.update(audio_path, status="failed", error=str(e))
+                continue
+            done += 1
+            audio_seconds += seconds
+            manifest.update(audio_path, status="done", transcript=transcript_path,
+                            audio_seconds=round(seconds, 1), elapsed=round(elapsed, 1), model=model_name)
+            print(f"[{done}/{len(pending)}] {transcript_path}")
+
+    wall_hours = (time.perf_counter() - start) / 3600
+    if wall_hours > 0:
+        report = (f"Transcribed {done} file(s), {audio_seconds / 3600:.2f} h of audio: "
+                  f"{done / wall_hours:.1f} files/h, {audio_seconds / 3600 / wall_hours:.2f} audio-h/h.")
+        logging.info(report)
+        print(report)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe the Records archive in parallel.")
+    parser.add_argument("--records", default=RECORDS_DIR, help="Records folder to scan")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: half the cores)")
+    parser.add_argument("--model", default=None, help="Whisper model name (default: from config or hardware)")
+    parser.add_argument("--keep-silence", action="store_true", help="Do not cut silence before Whisper")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="Resumable manifest file")
+    args = parser.parse_args()
+
+    run_batch(args.records, args.workers, args.model, not args.keep_silence, args.manifest)
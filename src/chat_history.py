@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+import re
+from collections import deque
+
+CHATS_DIR = os.path.join("Phineas_AI", "Data", "Chats")
+GENERAL_SUBJECT = "General"  # Questions asked outside any subject page
+
+
+class ChatHistoryStore:
+    """Append-only JSONL file of (question, answer) turns for one subject, compacted to its newest turns."""
+
+    def __init__(self, subject=None, chats_dir=CHATS_DIR, max_turns=200):
+        self.subject = subject or GENERAL_SUBJECT
+        self.max_turns = max_turns  # Turns kept in memory and on disk after compaction
+        if not os.path.exists(chats_dir):
+            os.makedirs(chats_dir)
+        safe_name = re.sub(r"[^\w\- ]", "_", self.subject)
+        self.path = os.path.join(chats_dir, f"{safe_name}.jsonl")
+        self._lines = 0  # Lines in the file, compacted once it holds twice max_turns
+        self.turns = self._read()  # Oldest first
+
+    def _read(self):
+        turns = deque(maxlen=self.max_turns)
+        if not os.path.exists(self.path):
+            return turns
+        with open(self.path, "r") as f:
+            for line in f:
+                self._lines += 1
+                try:
+                    turn = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping damaged line in {self.path}.")
+                    continue
+                turns.append((turn["human"], turn["AI"]))
+        return turns
+
+    def append(self, human, ai):
+        self.turns.append((human, ai))
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"human": human, "AI": ai}) + "\n")
+        self._lines += 1
+        if self._lines >= 2 * self.max_turns:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the file with only the turns still held in memory."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for human, ai in self.turns:
+                f.write(json.dumps({"human": human, "AI": ai}) + "\n")
+        os.replace(tmp_path, self.path)
+        self._lines = len(self.turns)
+
+    def recent(self, n):
+        """The newest n turns, oldest first."""
+        if n <= 0:
+            return []
+        return list(self.turns)[-n:]
@@ -0,0 +1,98 @@
+import hashlib
+import re
+import numpy as np
+
+SIMHASH_BITS = 64
+BANDS = 4  # Fingerprints sharing any 16-bit band are compared; finds every pair within BANDS - 1 bits
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def _hash64(token):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+
+def simhash(text, shingle=3):
+    """64-bit SimHash of text's word shingles; similar texts differ in few bits."""
+    words = normalize(text).split()
+    shingles = [" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))]
+    hashes = np.array([_hash64(token) for token in shingles], dtype=np.uint64)
+    bits = (hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)
+    # A bit is set when more shingles have it set than not
+    weights = 2 * bits.sum(axis=0, dtype=np.int64) - len(shingles)
+    return sum(1 << bit for bit in np.flatnonzero(weights > 0).tolist())
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def distinct_rows(vectors, neighbours=None, threshold=0.98):
+    """Indexes of the rows of vectors to keep, in order.
+
+    A row is dropped when its cosine similarity reaches threshold with the same row of neighbours
+    (its nearest stored vector; zeros where there is none) or with an earlier kept row.
+    """
+    vectors = _unit_rows(np.asarray(vectors, dtype=np.float32))
+    if neighbours is None:
+        stored = np.zeros(len(vectors))
+    else:
+        stored = np.einsum("ij,ij->i", vectors, _unit_rows(np.asarray(neighbours, dtype=np.float32)))
+    keep = []
+    for i, vector in enumerate(vectors):
+        if stored[i] >= threshold:
+            continue
+        if keep and float(np.max(vectors[keep] @ vector)) >= threshold:
+            continue
+        keep.append(i)
+    return keep
+
+
+def bands(fingerprint):
+    """The BANDS 16-bit slices of a SimHash, lowest first."""
+    width = SIMHASH_BITS // BANDS
+    return [(fingerprint >> (i * width)) & ((1 << width) - 1) for i in range(BANDS)]
+
+
+def fingerprint(text):
+    """(SHA-256 of the normalized text, SimHash, SimHash bands): what deduplication stores per chunk."""
+    value = simhash(text)
+    return hashlib.sha256(normalize(text).encode()).hexdigest(), value, bands(value)
+
+
+class ChunkDeduplicator:
+    """Rejects chunks that are exact or near-duplicates of stored chunks or of earlier ones in a batch.
+
+    Fingerprints of stored chunks are looked up in store (an SQLiteDocStore) rather than held in
+    memory. check() remembers nothing: fingerprints are stored with the chunks once they are indexed.
+    """
+
+    def __init__(self, store=None, max_distance=3):
+        self.store = store
+        self.max_distance = min(max_distance, BANDS - 1)  # Hamming distance still counted as a duplicate
+
+    def _is_near(self, value, others):
+        return any(bin(value ^ other).count("1") <= self.max_distance for other in others)
+
+    def check(self, texts):
+        """Return the indexes of texts to keep, in order."""
+        prints = [fingerprint(text) for text in texts]
+        seen = self.store.known_digests([digest for digest, _, _ in prints]) if self.store else set()
+        buckets = [{} for _ in range(BANDS)]  # Band value -> fingerprints of the kept texts with that band
+        keep = []
+        for i, (digest, simhash_value, text_bands) in enumerate(prints):
+            if digest in seen:
+                continue
+            if self._is_near(simhash_value, (other for bucket, band in zip(buckets, text_bands)
+                                             for other in bucket.get(band, ()))):
+                continue
+            if self.store and self._is_near(simhash_value, self.store.simhash_candidates(text_bands)):
+                continue
+            seen.add(digest)
+            for bucket, band in zip(buckets, text_bands):
+                bucket.setdefault(band, []).append(simhash_value)
+            keep.append(i)
+        return keep
@@ -0,0 +1,108 @@
+import json
+import sqlite3
+import threading
+
+
+BANDS = 4  # SimHash bands stored as columns, see src/dedup.py
+
+
+def _signed(value):
+    """SQLite integers are signed 64-bit; store unsigned SimHashes in the same bits."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class SQLiteDocStore:
+    """Chunk texts and metadata on disk, keyed by their position in the vector index.
+
+    Each chunk's deduplication fingerprint (see src/dedup.py) is kept alongside it, so duplicates are
+    found with indexed lookups instead of hashing every stored text into memory.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS docs (position INTEGER PRIMARY KEY, text TEXT, metadata TEXT)")
+        band_columns = ", ".join(f"band{i} INTEGER" for i in range(BANDS))
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS fingerprints (position INTEGER PRIMARY KEY, digest TEXT, "
+                         f"simhash INTEGER, {band_columns})")
+        self._db.execute("CREATE INDEX IF NOT EXISTS fingerprints_digest ON fingerprints (digest)")
+        for i in range(BANDS):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS fingerprints_band{i} ON fingerprints (band{i})")
+        self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def put_many(self, first_position, texts, metadatas, fingerprints=None):
+        """Store texts at consecutive positions, with their (digest, simhash, bands) fingerprints if given."""
+        # Replaying the vector log writes the same rows again, so inserts must be idempotent
+        rows = [(first_position + i, text, json.dumps(metadata))
+                for i, (text, metadata) in enumerate(zip(texts, metadatas))]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?)", rows)
+            if fingerprints is not None:
+                self._put_fingerprints(range(first_position, first_position + len(rows)), fingerprints)
+            self._db.commit()
+
+    def _put_fingerprints(self, positions, fingerprints):
+        rows = [(position, digest, _signed(simhash), *bands)
+                for position, (digest, simhash, bands) in zip(positions, fingerprints)]
+        self._db.executemany(f"INSERT OR REPLACE INTO fingerprints VALUES ({', '.join('?' * (3 + BANDS))})", rows)
+
+    def put_fingerprints(self, positions, fingerprints):
+        with self._lock:
+            self._put_fingerprints(positions, fingerprints)
+            self._db.commit()
+
+    def missing_fingerprints(self, limit=1000):
+        """Up to limit (position, text) pairs of documents stored without a fingerprint."""
+        with self._lock:
+            return self._db.execute("SELECT position, text FROM docs WHERE position NOT IN "
+                                    "(SELECT position FROM fingerprints) ORDER BY position LIMIT ?",
+                                    (limit,)).fetchall()
+
+    def known_digests(self, digests):
+        """The subset of digests that stored documents have."""
+        digests = list(set(digests))
+        found = set()
+        with self._lock:
+            for i in range(0, len(digests), 500):
+                batch = digests[i:i + 500]
+                rows = self._db.execute(f"SELECT digest FROM fingerprints WHERE digest IN "
+                                        f"({','.join('?' * len(batch))})", batch).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def simhash_candidates(self, bands):
+        """SimHashes of stored documents sharing at least one band with bands."""
+        where = " OR ".join(f"band{i} = ?" for i in range(BANDS))
+        with self._lock:
+            rows = self._db.execute(f"SELECT simhash FROM fingerprints WHERE {where}", list(bands)).fetchall()
+        return [simhash & ((1 << 64) - 1) for (simhash,) in rows]
+
+    def get_many(self, positions):
+        """Return {position: (text, metadata)} for the given positions."""
+        positions = list(set(positions))
+        found = {}
+        with self._lock:
+            for i in range(0, len(positions), 500):
+                batch = positions[i:i + 500]
+                rows = self._db.execute(f"SELECT position, text, metadata FROM docs WHERE position IN "
+                                        f"({','.join('?' * len(batch))})", batch).fetchall()
+                found.update((position, (text, json.loads(metadata))) for position, text, metadata in rows)
+        return found
+
+    def texts(self, first=0, last=None):
+        """Texts at positions first up to (not including) last, in position order."""
+        with self._lock:
+            if last is None:
+                rows = self._db.execute("SELECT text FROM docs WHERE position >= ? ORDER BY position", (first,))
+            else:
+                rows = self._db.execute("SELECT text FROM docs WHERE position >= ? AND position < ? "
+                                        "ORDER BY position", (first, last))
+            return [row[0] for row in rows.fetchall()]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
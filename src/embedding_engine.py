@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+import spacy
+from langchain.embeddings.base import Embeddings
+
+CACHE_FILE = os.path.join("Phineas_AI", "Data", "Cache", "embeddings.sqlite")
+
+# Only tok2vec feeds doc.vector in en_core_web_sm; everything else is skipped
+UNUSED_COMPONENTS = ["tagger", "parser", "ner", "lemmatizer", "attribute_ruler", "senter"]
+
+
+class EmbeddingCache:
+    """SQLite store of float32 vectors keyed by a hash of the model name and the text."""
+
+    def __init__(self, path=CACHE_FILE, max_entries=200000):
+        self.max_entries = max_entries
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB, last_used REAL)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model, text):
+        return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached."""
+        found = {}
+        with self._lock:
+            # SQLite limits the number of parameters per statement
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = self._db.execute(f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(batch))})",
+                                        batch).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+            if found:
+                self._db.executemany("UPDATE vectors SET last_used = ? WHERE key = ?",
+                                     [(time.time(), key) for key in found])
+                self._db.commit()
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)",
+                                 [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items])
+            self._db.execute("DELETE FROM vectors WHERE rowid IN (SELECT rowid FROM vectors "
+                             "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            self._db.commit()
+
+
+class SpacyBatchEmbeddings(Embeddings):
+    """spaCy document vectors computed in batches with nlp.pipe and cached on disk.
+
+    Drop-in replacement for LangChain's SpacyEmbeddings that skips the components it never uses.
+    """
+
+    def __init__(self, model_name="en_core_web_sm", batch_size=64, n_process=1, multiprocess_min=256,
+                 cache=None):
+        self.model_name = model_name
+        self.nlp = spacy.load(model_name, exclude=UNUSED_COMPONENTS)
+        self.batch_size = batch_size
+        # Worker processes are spawned by re-importing the main module, which inside the Kivy app would
+        # start another GUI; only command-line entry points (e.g. src.ann_index) raise this
+        self.n_process = n_process
+        self.multiprocess_min = multiprocess_min  # Smaller batches are not worth starting worker processes for
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.dim = self.nlp.vocab.vectors_length or self.nlp("dimension probe").vector.shape[0]
+
+    def _compute(self, texts):
+        n_process = self.n_process if len(texts) >= self.multiprocess_min else 1
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, doc in enumerate(self.nlp.pipe(texts, batch_size=self.batch_size, n_process=n_process)):
+            matrix[i] = doc.vector
+        return matrix
+
+    def embed_matrix(self, texts):
+        """Embed texts into a contiguous (len(texts), dim) float32 matrix, reusing cached vectors."""
+        texts = list(texts)
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return matrix
+
+        keys = [EmbeddingCache.make_key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(list(set(keys)))
+        missing = {}  # Key -> text, each distinct missing text embedded once
+        for i, key in enumerate(keys):
+            if key in cached:
+                matrix[i] = cached[key]
+            else:
+                missing.setdefault(key, texts[i])
+
+        if missing:
+            started = time.perf_counter()
+            computed = dict(zip(missing, self._compute(list(missing.values()))))
+            elapsed = time.perf_counter() - started
+            logging.info(f"Embedded {len(missing)} texts in {elapsed:.2f}s "
+                         f"({len(missing) / elapsed if elapsed else 0:.0f}/s), {len(cached)} from cache.")
+            for i, key in enumerate(keys):
+                if key in computed:
+                    matrix[i] = computed[key]
+            self.cache.put_many(computed.items())
+        return matrix
+
+    def embed_documents(self, texts):
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text):
+        return self.embed_matrix([text])[0].tolist()
@@ -0,0 +1,275 @@
+import heapq
+import json
+import logging
+import os
+import threading
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.vectorstores import FAISS
+from src.vector_wal import VectorWAL
+from src.docstore import SQLiteDocStore
+from src.dedup import ChunkDeduplicator, distinct_rows, fingerprint
+from src.ann_index import DEFAULT_THRESHOLDS, build_index, choose_index_type, index_type
+
+
+def read_flags(kind):
+    """FAISS read flags that memory-map the bulk of a base index of the given type, where FAISS can.
+
+    IO_FLAG_MMAP only maps IVF inverted lists; flat codes need IO_FLAG_MMAP_IFC (FAISS 1.9 and later).
+    HNSW indexes, graph and vectors, are read into memory: about 4 * (dim + 2 * HNSW_M) bytes per vector.
+    """
+    if kind in ("ivf_flat", "ivf_pq"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    if kind == "flat" and hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+    return 0
+
+
+class IndexShard:
+    """One subject's vectors: a base index (memory-mapped where its type allows, see read_flags), an
+    in-memory index of vectors added since the base was written (also kept in a write-ahead log) and an
+    SQLite store of the chunk texts."""
+
+    def __init__(self, name, index_dir, embeddings, compact_every=64):
+        self.name = name
+        self.embeddings = embeddings
+        self.index_dir = index_dir
+        self.index_file = os.path.join(index_dir, "faiss_index.bin")  # LangChain save_local directory, now migrated
+        self.manifest_file = os.path.join(index_dir, "index_manifest.json")  # Names the current base file
+        if not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        self.compact_every = compact_every  # Vectors added since the base was written that trigger a rewrite
+        self.compaction_thread = None
+        self.thresholds = DEFAULT_THRESHOLDS  # Vector counts at which compaction switches index type
+        self.dedup_similarity = 0.98  # Cosine similarity at which a new chunk counts as a copy of a stored one
+
+        # Guards the indexes, which the recorder writes while the chat popup reads them
+        self.lock = threading.RLock()
+        self._compacting = threading.Lock()
+        self.docs = SQLiteDocStore(os.path.join(index_dir, "docs.sqlite"))
+        self.deduplicator = ChunkDeduplicator(self.docs)  # Looks fingerprints up in the docstore
+        self.base = None  # Read-only; when mapped, only the pages searches touch are read from disk
+        self.base_file = None
+        self.generation = 0
+        self.delta = None  # Flat index of the vectors added since the base was written
+        self._migrate_langchain_index()
+        self._load()
+
+    def __len__(self):
+        return (self.base.ntotal if self.base else 0) + (self.delta.ntotal if self.delta else 0)
+
+    def _open_base(self, path, kind=None):
+        if kind is None:
+            # Manifests written before the type was recorded: read once to find out, then map if possible
+            index = faiss.read_index(path)
+            kind = index_type(index)
+            if not read_flags(kind):
+                return index
+            del index
+        flags = read_flags(kind)
+        if not flags:
+            logging.info(f"Loading {kind} index {path} into memory.")
+            return faiss.read_index(path)
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError as e:
+            logging.warning(f"Could not memory-map {path} ({e}); loading it into memory.")
+            return faiss.read_index(path)
+
+    def _write_base_file(self, index):
+        """Write index to the next base file name and return its path."""
+        path = os.path.join(self.index_dir, f"base-{self.generation + 1}.faiss")
+        faiss.write_index(index, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        return path
+
+    def _set_base(self, path, kind):
+        """Point the manifest at a written base file of the given index type and open it in place of the old one."""
+        tmp_path = self.manifest_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"base": os.path.basename(path), "generation": self.generation + 1, "type": kind}, f)
+        os.replace(tmp_path, self.manifest_file)
+        old_file = self.base_file
+        self.base, self.base_file, self.generation = self._open_base(path, kind), path, self.generation + 1
+        self.delta = None
+        if old_file:
+            try:
+                os.remove(old_file)
+            except OSError:
+                pass  # Still mapped on Windows; removed at the next start instead
+        logging.info(f"FAISS index saved to {path}.")
+
+    def _remove_stale_files(self):
+        keep = os.path.basename(self.base_file) if self.base_file else None
+        for name in os.listdir(self.index_dir):
+            if name.startswith("base-") and name != keep:
+                try:
+                    os.remove(os.path.join(self.index_dir, name))
+                except OSError:
+                    pass
+
+    def _migrate_langchain_index(self):
+        """Move an index saved by LangChain's FAISS.save_local (pickled docstore) to the base file layout."""
+        # A save interrupted between its two renames leaves the complete index under .tmp
+        tmp_dir = self.index_file + ".tmp"
+        if not os.path.exists(self.index_file) and os.path.exists(tmp_dir):
+            os.rename(tmp_dir, self.index_file)
+        if os.path.exists(self.manifest_file) or not os.path.exists(self.index_file):
+            return
+
+        logging.info(f"Migrating {self.index_file} to a base index file and SQLite docstore.")
+        legacy = FAISS.load_local(self.index_file, self.embeddings)
+        ids, count = legacy.index_to_docstore_id, legacy.index.ntotal
+        for first in range(0, count, 1000):
+            docs = [legacy.docstore.search(ids[i]) for i in range(first, min(first + 1000, count))]
+            self._store_docs(first, [doc.page_content for doc in docs], [doc.metadata for doc in docs])
+        self._set_base(self._write_base_file(legacy.index), index_type(legacy.index))
+        os.rename(self.index_file, self.index_file + ".migrated")
+
+    def _load(self):
+        """Open the base index, then replay vectors logged since it was written."""
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, "r") as f:
+                manifest = json.load(f)
+            self.base_file = os.path.join(self.index_dir, manifest["base"])
+            self.generation = manifest["generation"]
+            if self.base is None:
+                logging.info(f"Opening FAISS index {self.base_file}.")
+                self.base = self._open_base(self.base_file, manifest.get("type"))
+        else:
+            logging.info(f"No existing FAISS index for {self.name}. Starting fresh.")
+        self._remove_stale_files()
+
+        # Records the base already holds are skipped, so an interrupted compaction is harmless
+        self.wal = VectorWAL(self.index_file + ".wal")
+        vectors, texts, metadatas = self.wal.replay(skip_below=len(self))
+        if texts:
+            self._store_docs(len(self), texts, metadatas)
+            self._add_to_delta(np.asarray(vectors, dtype=np.float32))
+        self._backfill_fingerprints()
+
+    def _store_docs(self, position, texts, metadatas):
+        self.docs.put_many(position, texts, metadatas, [fingerprint(text) for text in texts])
+
+    def _backfill_fingerprints(self):
+        """Fingerprint documents stored before fingerprints were kept in the docstore."""
+        rows = self.docs.missing_fingerprints()
+        if rows:
+            logging.info(f"Fingerprinting the stored documents of the {self.name} index for deduplication.")
+        while rows:
+            self.docs.put_fingerprints([position for position, _ in rows], [fingerprint(text) for _, text in rows])
+            rows = self.docs.missing_fingerprints()
+
+    def _add_to_delta(self, vectors):
+        if self.delta is None:
+            self.delta = faiss.IndexFlatL2(vectors.shape[1])
+        self.delta.add(vectors)
+
+    def _texts(self, first=0):
+        """Texts of the documents at index positions first onwards, in position order."""
+        return self.docs.texts(first, len(self))
+
+    def vectors(self):
+        """Exact vectors of every document in position order (from the embedding cache, not the index)."""
+        with self.lock:
+            texts = self._texts()
+        return self.embeddings.embed_matrix(texts)
+
+    def compact(self):
+        """Rewrite the base index with the newer vectors merged in, switching index type if needed."""
+        with self._compacting:
+            with self.lock:
+                count = len(self)
+                base_count = self.base.ntotal if self.base else 0
+                current = index_type(self.base) if self.base else None
+                wanted = choose_index_type(count, self.thresholds)
+                if not count or (count == base_count and current == wanted):
+                    return
+                new_vectors = self.delta.reconstruct_n(0, count - base_count) if count > base_count else None
+                texts = self._texts() if current not in (None, wanted) else None
+
+            # Build and write the new base outside the lock so searches and inserts carry on meanwhile
+            logging.info(f"Compacting {count - base_count} new vectors into the {self.name} index ({wanted}).")
+            if current is None:
+                index = build_index(wanted, new_vectors)
+            elif current != wanted:
+                # Vectors come from the embedding cache because compressed indexes cannot give back exact ones
+                index = build_index(wanted, self.embeddings.embed_matrix(texts))
+            else:
+                index = faiss.read_index(self.base_file)
+                if new_vectors is not None:
+                    index.add(new_vectors)
+            path = self._write_base_file(index)
+
+            with self.lock:
+                added_since = len(self) - count
+                later_vectors = self.delta.reconstruct_n(count - base_count, added_since) if added_since else None
+                self._set_base(path, wanted)
+                if later_vectors is not None:
+                    # Their log records stay; replay skips the ones the new base already holds
+                    self._add_to_delta(later_vectors)
+                else:
+                    self.wal.reset()
+
+    def _maybe_compact(self):
+        if self.delta is None or self.delta.ntotal < self.compact_every:
+            return
+        if self.compaction_thread and self.compaction_thread.is_alive():
+            return
+        self.compaction_thread = threading.Thread(target=self.compact, daemon=True)
+        self.compaction_thread.start()
+
+    def deduplicate(self, texts):
+        """Indexes of texts that are not exact or SimHash near-duplicates of stored or earlier texts.
+
+        Nothing is remembered: the kept texts' fingerprints are stored by add(), once they are indexed.
+        """
+        return self.deduplicator.check(texts)
+
+    def distinct(self, vectors):
+        """Indexes of vectors that are not nearly identical to their nearest stored vector or to each other."""
+        neighbours = np.zeros_like(vectors)
+        with self.lock:
+            nearest = [hits[0][1] if hits else None for hits in self._search_positions(vectors, 1)]
+            rows = [row for row, position in enumerate(nearest) if position is not None]
+            found = self.docs.get_many([nearest[row] for row in rows])
+        if rows:
+            # Exact stored vectors come from the embedding cache; compressed indexes only hold approximations
+            neighbours[rows] = self.embeddings.embed_matrix([found[nearest[row]][0] for row in rows])
+        return distinct_rows(vectors, neighbours, self.dedup_similarity)
+
+    def add(self, texts, vectors, metadatas):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self.lock:
+            logging.info(f"Appending {len(texts)} documents to the {self.name} index.")
+            position = len(self)
+            # The log comes first: after a crash it is replayed into both the docstore and the delta index
+            self.wal.append(position, vectors, texts, metadatas)
+            self._store_docs(position, texts, metadatas)
+            self._add_to_delta(vectors)
+            self._maybe_compact()
+
+    def _search_positions(self, vectors, k):
+        """Top k (distance, position) pairs per query across the base and delta indexes, closest first."""
+        results = [[] for _ in vectors]
+        base_count = self.base.ntotal if self.base else 0
+        for index, offset in ((self.base, 0), (self.delta, base_count)):
+            if index is None or not index.ntotal or not len(vectors):
+                continue
+            distances, ids = index.search(vectors, min(k, index.ntotal))
+            for hits, row_distances, row_ids in zip(results, distances, ids):
+                # -1 marks fewer than k results (e.g. few IVF lists probed)
+                hits.extend((float(d), offset + int(i)) for d, i in zip(row_distances, row_ids) if i != -1)
+        return [heapq.nsmallest(k, hits) for hits in results]
+
+    def search(self, vectors, k):
+        """Search a (queries, dim) float32 matrix; one list of (distance, document) per query, closest first.
+
+        Only the documents of the returned hits are read from the docstore.
+        """
+        with self.lock:
+            hits = self._search_positions(vectors, k)
+            docs = self.docs.get_many([position for row in hits for _, position in row])
+        return [[(distance, Document(page_content=docs[position][0], metadata=docs[position][1]))
+                 for distance, position in row if position in docs] for row in hits]
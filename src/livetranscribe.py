@@ -0,0 +1,183 @@
+import logging
+import threading
+import numpy as np
+from src.audiostream import WHISPER_RATE, Resampler, pcm16_to_float32, read_wav_float32
+from src.vad import is_quiet, remove_silence
+
+
+def append_transcript(filename, text, max_words_per_line=10):
+    """Append text to a transcript file, wrapped to a fixed number of words per line."""
+    words = text.split()
+    lines = [' '.join(words[i:i + max_words_per_line])
+             for i in range(0, len(words), max_words_per_line)]
+    with open(filename, "a") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def _cache_name(whisper_model):
+    return getattr(whisper_model, "cache_name", type(whisper_model).__name__)
+
+
+def transcribe_file(whisper_model, filename, skip_silence=True, cache=None, **options):
+    """Run Whisper on a 16-bit PCM WAV file, looking it up in cache before decoding it."""
+    key = None
+    if cache is not None:
+        key = cache.file_key(filename, _cache_name(whisper_model), dict(options, skip_silence=skip_silence))
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    result = transcribe_array(whisper_model, read_wav_float32(filename), skip_silence, **options)
+    if key is not None:
+        cache.put(key, result)
+    return result
+
+
+def transcribe_array(whisper_model, audio, skip_silence=True, cache=None, **options):
+    """Run Whisper on 16 kHz float32 audio, optionally cutting silence out first."""
+    key = None
+    if cache is not None:
+        key = cache.key(audio, _cache_name(whisper_model), dict(options, skip_silence=skip_silence))
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    if not skip_silence:
+        result = whisper_model.transcribe(audio, **options)
+    else:
+        speech, timestamps = remove_silence(audio, WHISPER_RATE)
+        if speech is None and is_quiet(audio, WHISPER_RATE):
+            result = {"text": "", "segments": []}
+        elif speech is None:
+            # Loud enough to be speech: never trade it for an empty transcript on the VAD's word alone
+            logging.warning("VAD found no speech in loud audio, transcribing it untrimmed.")
+            result = whisper_model.transcribe(audio, **options)
+        else:
+            result = whisper_model.transcribe(speech, **options)
+            # Segment times refer to the compressed audio, shift them back onto the recording
+            timestamps.remap_segments(result.get("segments", []))
+
+    if key is not None:
+        cache.put(key, result)
+    return result
+
+
+class LiveTranscriber:
+    """Transcribe audio in fixed, overlapping windows on a worker thread while it is being recorded."""
+
+    def __init__(self, whisper_model, transcription_filename, capture_rate,
+                 window_seconds=30, overlap_seconds=2, skip_silence=True, store=None):
+        self.whisper_model = whisper_model
+        self.store = store  # Optional TranscriptStore that receives committed segments
+        self.skip_silence = skip_silence
+        self.transcription_filename = transcription_filename
+        self.resampler = Resampler(capture_rate, WHISPER_RATE)
+        self.window = int(window_seconds * WHISPER_RATE)
+        self.overlap = int(overlap_seconds * WHISPER_RATE)
+
+        self.text = ""
+        self.segments = []  # Committed segments with start/end relative to the whole recording
+        self.committed_until = 0.0  # End time of the last committed segment, in seconds
+
+        self._pending = []  # Resampled audio not yet handed to Whisper
+        self._pending_samples = 0
+        self._offset = 0  # Absolute sample index of the first pending sample
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logging.info("Live transcription started.")
+
+    def feed(self, data):
+        """Queue one captured int16 PCM chunk for transcription."""
+        samples = self.resampler.process(pcm16_to_float32(data))
+        if not len(samples):
+            return
+        with self._condition:
+            self._pending.append(samples)
+            self._pending_samples += len(samples)
+            if self._pending_samples >= self.window:
+                self._condition.notify()
+
+    def stop(self):
+        """Transcribe whatever audio is left and wait for the worker to finish."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        logging.info("Live transcription finished.")
+
+    def _take_window(self):
+        """Wait for a full window (or the end of the recording) and return it with its start offset.
+
+        Nothing is consumed here; _advance drops audio once the window's segments are committed.
+        """
+        with self._condition:
+            while self._pending_samples < self.window and not self._stopping:
+                self._condition.wait()
+            if not self._pending_samples:
+                return None, None, True
+
+            audio = np.concatenate(self._pending)
+            self._pending = [audio]
+            final = self._stopping and len(audio) <= self.window
+            return audio[:self.window], self._offset, final
+
+    def _advance(self, samples):
+        """Drop the first samples of pending audio; the next window starts right after them."""
+        with self._condition:
+            audio = np.concatenate(self._pending)[samples:]
+            self._pending = [audio] if len(audio) else []
+            self._pending_samples = len(audio)
+            self._offset += samples
+
+    def _run(self):
+        while True:
+            window, offset, final = self._take_window()
+            if window is None:
+                break
+            try:
+                consumed = self._transcribe_window(window, offset, final)
+            except Exception as e:
+                logging.error(f"An error occurred with live Whisper transcription: {e}")
+                consumed = len(window) if final else len(window) - self.overlap
+            if final:
+                break
+            self._advance(consumed)
+
+    def _transcribe_window(self, window, offset, final):
+        """Commit the window's finished segments and return how many samples the next window skips."""
+        start_time = offset / WHISPER_RATE
+        # Segments still running into the overlap are left for the next window, which hears them whole
+        commit_before = float("inf") if final else start_time + (len(window) - self.overlap) / WHISPER_RATE
+
+        result = transcribe_array(self.whisper_model, window, self.skip_silence,
+                                  initial_prompt=self.text[-200:] or None)
+        committed = []
+        for segment in result.get("segments", []):
+            start = start_time + segment["start"]
+            end = min(start_time + segment["end"], start_time + len(window) / WHISPER_RATE)
+            if end > commit_before:
+                break
+            committed.append(dict(segment, start=start, end=end))
+            self.committed_until = end
+
+        if committed:
+            self.segments.extend(committed)
+            text = " ".join(segment["text"].strip() for segment in committed)
+            self.text = f"{self.text} {text}".strip()
+            append_transcript(self.transcription_filename, text)
+            if self.store is not None:
+                self.store.append(committed)
+            logging.info(f"Live transcript updated up to {self.committed_until:.1f}s.")
+            # The next window starts where the last committed segment ended, so nothing is heard twice
+            return max(1, int(round((self.committed_until - start_time) * WHISPER_RATE)))
+
+        # Nothing finished in this window (silence, or one segment longer than it): move on as before
+        return len(window) - self.overlap
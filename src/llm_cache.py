@@ -0,0 +1,113 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+CACHE_FILE = os.path.join("Phineas_AI", "Data", "Cache", "llm_cache.sqlite")
+
+
+class LLMCache:
+    """SQLite cache of LLM replies with a TTL, LRU eviction and an optional semantic tier."""
+
+    def __init__(self, path=CACHE_FILE, ttl=7 * 24 * 3600, max_entries=5000, semantic_threshold=0.95):
+        self.ttl = ttl  # Seconds before an entry is considered stale
+        self.max_entries = max_entries
+        self.semantic_threshold = semantic_threshold  # Cosine similarity needed for a semantic hit
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses ("
+                         "key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL, last_used REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS semantic ("
+                         "id INTEGER PRIMARY KEY, model TEXT, vector BLOB, response TEXT, created REAL, last_used REAL)")
+        self._db.commit()
+        self._vectors = {}  # Partition -> (ids, normalized matrix), rebuilt after writes
+
+    @staticmethod
+    def make_key(model, prompt, **params):
+        payload = json.dumps({"model": model, "prompt": prompt, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        logging.info(f"LLM cache hit {key[:12]}.")
+        return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                             (key, model, response, now, now))
+            self._evict("responses", now)
+            self._db.commit()
+
+    def _evict(self, table, now):
+        """Drop expired rows, then the least recently used ones beyond max_entries."""
+        self._db.execute(f"DELETE FROM {table} WHERE created < ?", (now - self.ttl,))
+        self._db.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} "
+                         f"ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def _matrix(self, partition):
+        if partition not in self._vectors:
+            rows = self._db.execute("SELECT id, vector FROM semantic WHERE model = ? AND created >= ?",
+                                    (partition, time.time() - self.ttl)).fetchall()
+            ids = [row[0] for row in rows]
+            matrix = np.array([np.frombuffer(row[1], dtype=np.float32) for row in rows], dtype=np.float32)
+            self._vectors[partition] = (ids, matrix)
+        return self._vectors[partition]
+
+    def get_similar(self, partition, vector):
+        """Return the cached reply to the most similar earlier question, if it is similar enough.
+
+        Only questions cached under the same partition are compared: the model and whatever else the
+        reply depends on besides the question, such as the documents it was retrieved from.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        with self._lock:
+            ids, matrix = self._matrix(partition)
+            if not ids:
+                return None
+            scores = matrix @ (vector / norm)
+            best = int(np.argmax(scores))
+            if scores[best] < self.semantic_threshold:
+                return None
+            self._db.execute("UPDATE semantic SET last_used = ? WHERE id = ?", (time.time(), ids[best]))
+            self._db.commit()
+            row = self._db.execute("SELECT response FROM semantic WHERE id = ?", (ids[best],)).fetchone()
+        if row is None:
+            return None
+        logging.info(f"Semantic LLM cache hit (similarity {scores[best]:.3f}).")
+        return row[0]
+
+    def put_similar(self, partition, vector, response):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT INTO semantic (model, vector, response, created, last_used) "
+                             "VALUES (?, ?, ?, ?, ?)", (partition, (vector / norm).tobytes(), response, now, now))
+            self._evict("semantic", now)
+            self._db.commit()
+            self._vectors.pop(partition, None)
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+JOBS_DIR = os.path.join("Phineas_AI", "Data", "Jobs")
+STAGES = ["save", "transcribe", "summarize", "index"]
+
+
+class JobStore:
+    """One JSON file per job, rewritten atomically after every stage."""
+
+    def __init__(self, jobs_dir=JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        if not os.path.exists(self.jobs_dir):
+            os.makedirs(self.jobs_dir)
+
+    def save(self, job):
+        job["updated"] = time.time()
+        path = os.path.join(self.jobs_dir, f"{job['id']}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def unfinished(self):
+        """Jobs that were queued, running or failed when the app last stopped, oldest first."""
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), "r") as f:
+                    job = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logging.error(f"Skipping unreadable job file {name}: {e}")
+                continue
+            if job.get("status") != "done":
+                jobs.append(job)
+        return sorted(jobs, key=lambda job: job.get("created", 0))
+
+
+class LecturePipeline:
+    """Run lecture jobs through save, transcribe, summarize and index on a background worker."""
+
+    def __init__(self, stages, store=None, workers=1):
+        # Stage name -> callable(job, runtime): job is the persisted dict, runtime holds in-memory
+        # objects (such as a live transcriber) that are lost on restart
+        self.stages = stages
+        self.store = store or JobStore()
+        self.runtime = {}  # Job id -> in-memory objects handed over by the recorder
+        self.progress = {}  # Job id -> latest progress message, read by the UI
+        self._queue = queue.Queue()
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, runtime=None, **fields):
+        """Queue a new job and return its id."""
+        job = dict(fields, id=uuid.uuid4().hex[:12], created=time.time(), completed=[], status="queued")
+        self.runtime[job["id"]] = runtime or {}
+        self.store.save(job)
+        self._report(job, "queued")
+        self._queue.put(job)
+        return job["id"]
+
+    def resume(self):
+        """Re-queue jobs left unfinished by a crash or restart; they continue after their last stage."""
+        for job in self.store.unfinished():
+            logging.info(f"Resuming job {job['id']} after stage(s) {job['completed']}.")
+            self._queue.put(job)
+
+    def _report(self, job, message):
+        self.progress[job["id"]] = f"{job.get('subject', '')}: {message}"
+        logging.info(f"Job {job['id']}: {message}")
+
+    def status_text(self):
+        """Progress of the most recent jobs, one line each."""
+        return "\n".join(list(self.progress.values())[-3:])
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            runtime = self.runtime.get(job["id"], {})
+            job["status"] = "running"
+            try:
+                for stage in STAGES:
+                    if stage in job["completed"]:
+                        continue
+                    self._report(job, f"{stage}...")
+                    self.stages[stage](job, runtime)
+                    job["completed"].append(stage)
+                    self.store.save(job)
+                job["status"] = "done"
+                job.pop("error", None)
+                self._report(job, "done")
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                self._report(job, f"failed during {stage}: {e}")
+            finally:
+                self.store.save(job)
+                self.runtime.pop(job["id"], None)
@@ -0,0 +1,42 @@
+import logging
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may be sent."""
+
+    def __init__(self, requests_per_minute=30, burst=5):
+        self.rate = requests_per_minute / 60.0  # Tokens added per second
+        self.capacity = burst  # Requests that may go out back to back after an idle spell
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def with_retries(func, *args, attempts=3, base_delay=1.0, limiter=None, **kwargs):
+    """Call func, retrying failures with exponential backoff and jitter; the last failure is raised."""
+    for attempt in range(attempts):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = base_delay * 2 ** attempt * (1 + random.random())
+            logging.warning(f"Attempt {attempt + 1} of {attempts} failed ({e}), retrying in {delay:.1f}s.")
+            time.sleep(delay)
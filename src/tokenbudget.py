@@ -0,0 +1,106 @@
+try:
+    import tiktoken
+    # Not Llama's own tokenizer, but close enough for budgeting prompt sizes
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+
+def count_tokens(text):
+    """Token count of text; exact with tiktoken installed, otherwise ~4 characters per token."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def split_by_tokens(text, max_tokens):
+    """Split text at line breaks into chunks of at most max_tokens tokens."""
+    lines = []
+    for line in text.splitlines():
+        tokens = count_tokens(line)
+        if tokens <= max_tokens:
+            lines.append((line, tokens))
+            continue
+        # A single oversized line is cut into word runs of roughly max_tokens each
+        words = line.split()
+        step = max(1, len(words) * max_tokens // tokens)
+        for i in range(0, len(words), step):
+            piece = " ".join(words[i:i + step])
+            lines.append((piece, count_tokens(piece)))
+
+    return ["\n".join(group) for group in pack_by_tokens(lines, max_tokens)]
+
+
+def pack_by_tokens(items, max_tokens):
+    """Group (text, tokens) pairs, in order, into lists of texts of at most max_tokens tokens each."""
+    groups, current, current_tokens = [], [], 0
+    for text, tokens in items:
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text down to at most max_tokens tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+class TokenBudget:
+    """Fit the query, retrieved chunks and chat history of one prompt into a fixed token budget."""
+
+    def __init__(self, total_tokens=6000, answer_tokens=1024, context_share=0.6, min_chunk_tokens=50):
+        self.total_tokens = total_tokens  # Whole prompt plus answer
+        self.answer_tokens = answer_tokens  # Kept free for the reply
+        self.context_share = context_share  # Part of what is left after the query that retrieval may use
+        self.min_chunk_tokens = min_chunk_tokens  # Shorter tails of a cut chunk are dropped instead
+
+    def fit(self, query, chunks, history):
+        """Trim chunks (best first) and history ((human, ai) turns, oldest first) to the budget.
+
+        Returns the kept chunks, the kept history and a dict of tokens used per source.
+        """
+        query_tokens = count_tokens(query)
+        remaining = max(self.total_tokens - self.answer_tokens - query_tokens, 0)
+
+        context_budget = int(remaining * self.context_share)
+        kept_chunks, context_tokens = [], 0
+        for text in chunks:
+            tokens = count_tokens(text)
+            if context_tokens + tokens > context_budget:
+                room = context_budget - context_tokens
+                if room >= self.min_chunk_tokens:
+                    kept_chunks.append(truncate_to_tokens(text, room))
+                    context_tokens += room
+                break
+            kept_chunks.append(text)
+            context_tokens += tokens
+
+        # History gets whatever retrieval left unused, newest turns first
+        history_budget = remaining - context_tokens
+        kept_history, history_tokens = [], 0
+        for human, ai in reversed(history):
+            tokens = count_tokens(human) + count_tokens(ai)
+            if history_tokens + tokens > history_budget:
+                break
+            kept_history.append((human, ai))
+            history_tokens += tokens
+        kept_history.reverse()
+
+        usage = {
+            "query": query_tokens,
+            "context": context_tokens,
+            "history": history_tokens,
+            "total": query_tokens + context_tokens + history_tokens,
+        }
+        return kept_chunks, kept_history, usage
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import logging
+import os
+import wave
+import numpy as np
+
+CACHE_DIR = os.path.join("Phineas_AI", "Data", "Cache", "Transcripts")
+
+
+class TranscriptCache:
+    """On-disk cache of full Whisper results, keyed by audio content, model and decoding options."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def key(self, audio, model_name, options):
+        """Hash the 16 kHz float32 samples together with everything that changes the output."""
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(audio, dtype=np.float32).view(np.uint8))
+        digest.update(json.dumps({"model": model_name, "options": options}, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def file_key(self, filename, model_name, options, block_frames=256 * 1024):
+        """Hash a WAV file's format and PCM bytes, streamed from disk, with everything that changes the output.
+
+        Computed before the file is decoded, so a hit costs one read of the file and no resampling.
+        """
+        digest = hashlib.sha256()
+        with wave.open(filename, "rb") as wf:
+            digest.update(json.dumps([wf.getnchannels(), wf.getsampwidth(), wf.getframerate()]).encode())
+            while True:
+                data = wf.readframes(block_frames)
+                if not data:
+                    break
+                digest.update(data)
+        # Tagged so a file key can never equal the key of an array with the same bytes
+        digest.update(json.dumps({"model": model_name, "options": options, "source": "wav"},
+                                 sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                result = json.load(f)
+            os.utime(path)  # The modification time doubles as the LRU timestamp
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        logging.info(f"Transcript cache hit {key[:12]}.")
+        return result
+
+    def put(self, key, result):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            # NumPy scalars can appear in segment fields, store them as plain numbers
+            json.dump(result, f, default=lambda o: o.item() if hasattr(o, "item") else str(o))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                logging.info(f"Evicted transcript cache entry {name}.")
+            except FileNotFoundError:
+                pass  # Another process evicted it first
+            total -= size
@@ -0,0 +1,111 @@
+import json
+import math
+import os
+import struct
+
+
+def segment_record(segment):
+    """Keep the fields downstream consumers use from a Whisper segment."""
+    record = {
+        "start": round(float(segment["start"]), 2),
+        "end": round(float(segment["end"]), 2),
+        "text": segment["text"].strip(),
+    }
+    if "avg_logprob" in segment:
+        record["confidence"] = round(math.exp(float(segment["avg_logprob"])), 3)
+    if "no_speech_prob" in segment:
+        record["no_speech_prob"] = round(float(segment["no_speech_prob"]), 3)
+    return record
+
+
+class TranscriptStore:
+    """Append-only JSONL file of transcript segments with a fixed-width index for lookups by time."""
+
+    RECORD = struct.Struct("<ddQ")  # (start, end, byte offset of the segment's line) per segment
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        for p in (self.path, self.index_path):
+            if not os.path.exists(p):
+                open(p, "wb").close()
+        self._repair()
+
+    def __len__(self):
+        return os.path.getsize(self.index_path) // self.RECORD.size
+
+    def _repair(self):
+        """Bring the index back in line with the segments file after an interrupted append."""
+        index_size = os.path.getsize(self.index_path)
+        if index_size % self.RECORD.size:
+            with open(self.index_path, "r+b") as f:
+                f.truncate(index_size - index_size % self.RECORD.size)
+
+        count = len(self)
+        resume = 0
+        if count:
+            _, _, offset = self._entry(count - 1)
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                resume = offset + len(f.readline())
+
+        with open(self.path, "r+b") as data, open(self.index_path, "ab") as index:
+            data.seek(resume)
+            offset = resume
+            for line in data:
+                if not line.endswith(b"\n"):
+                    break
+                segment = json.loads(line)
+                index.write(self.RECORD.pack(segment["start"], segment["end"], offset))
+                offset += len(line)
+            data.truncate(offset)  # Drop a partly written last line
+
+    def append(self, segments):
+        """Append Whisper segments (already in recording time) to the store."""
+        with open(self.path, "ab") as data, open(self.index_path, "ab") as index:
+            offset = data.tell()
+            for segment in segments:
+                record = segment_record(segment)
+                line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+                data.write(line)
+                index.write(self.RECORD.pack(record["start"], record["end"], offset))
+                offset += len(line)
+
+    def _entry(self, i):
+        with open(self.index_path, "rb") as f:
+            f.seek(i * self.RECORD.size)
+            return self.RECORD.unpack(f.read(self.RECORD.size))
+
+    def _read_lines(self, first, last):
+        if first >= last:
+            return []
+        offset = self._entry(first)[2]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return [json.loads(f.readline()) for _ in range(last - first)]
+
+    def read_from(self, cursor=0):
+        """Return segments appended since cursor and the cursor to pass next time."""
+        end = len(self)
+        return self._read_lines(cursor, end), end
+
+    def _bisect(self, go_right):
+        """Index of the first entry for which go_right(entry) is False."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if go_right(self._entry(mid)):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def between(self, start, end):
+        """Return the segments that overlap the [start, end) time range, in seconds."""
+        # Segments are appended in time order, so both ends of the range are found by bisection
+        first = self._bisect(lambda entry: entry[1] <= start)
+        last = self._bisect(lambda entry: entry[0] < end)
+        return self._read_lines(first, max(first, last))
+
+    def text(self):
+        return " ".join(segment["text"] for segment in self.read_from(0)[0])
@@ -0,0 +1,116 @@
+import logging
+import numpy as np
+
+SPEECH_DBFS = -45.0  # Frame energy that room noise stays below and speech at the microphone reaches
+
+
+def _runs(mask):
+    """Return start and end indices of the runs of True values in a boolean array."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2]
+
+
+def frame_features(samples, rate, frame_ms=30):
+    """Compute per-frame energy (dBFS) and zero-crossing rate for a mono signal."""
+    if samples.dtype == np.int16:
+        samples = samples.astype(np.float32) / 32768.0
+    frame_len = int(rate * frame_ms / 1000)
+    count = len(samples) // frame_len
+    frames = samples[:count * frame_len].reshape(count, frame_len)
+
+    energy = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+    return energy, zcr, frame_len
+
+
+def detect_speech(samples, rate, frame_ms=30, start_db=12.0, stop_db=6.0, zcr_min=0.25,
+                  pad_ms=200, min_silence_ms=500, min_floor_db=-70.0, speech_dbfs=SPEECH_DBFS):
+    """Return (start, end) sample ranges that contain speech."""
+    energy, zcr, frame_len = frame_features(samples, rate, frame_ms)
+    if not len(energy):
+        return []
+
+    # The floor is measured on the same buffer, so continuous speech (AGC mics, reverberant rooms,
+    # short live windows) barely rises above it; a loud enough buffer with little spread is all speech
+    level = np.percentile(energy, 90)
+    if level - np.percentile(energy, 10) < start_db and level > speech_dbfs:
+        return [(0, len(samples))]
+
+    # Speech starts start_db above the noise floor (or stop_db above it with a high zero-crossing
+    # rate, for unvoiced consonants) and continues until energy drops below floor + stop_db
+    floor = max(np.percentile(energy, 10), min_floor_db)
+    low = energy > floor + stop_db
+    high = (energy > floor + start_db) | (low & (zcr > zcr_min))
+
+    # Keep each above-low run only if it reaches the start threshold somewhere
+    starts, ends = _runs(low)
+    if not len(starts):
+        return []
+    keep = np.maximum.reduceat(high.astype(np.int8), starts).astype(bool)
+    starts, ends = starts[keep], ends[keep]
+
+    pad = int(pad_ms / frame_ms)
+    min_gap = int(min_silence_ms / frame_ms)
+    spans = []
+    for start, end in zip(np.maximum(starts - pad, 0), np.minimum(ends + pad, len(energy))):
+        if spans and start - spans[-1][1] < min_gap:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+
+    # Frames cover the signal up to a partial last frame, which joins the last span if it touches it
+    total = len(samples)
+    return [(int(s) * frame_len, total if e == len(energy) else int(e) * frame_len) for s, e in spans]
+
+
+class TimestampMap:
+    """Map times in silence-compressed audio back to times in the original recording."""
+
+    def __init__(self, compressed_starts, original_starts):
+        self.compressed_starts = np.asarray(compressed_starts, dtype=np.float64)
+        self.original_starts = np.asarray(original_starts, dtype=np.float64)
+
+    def to_original(self, t):
+        if not len(self.compressed_starts):
+            return t
+        idx = max(int(np.searchsorted(self.compressed_starts, t, side="right")) - 1, 0)
+        return float(self.original_starts[idx] + (t - self.compressed_starts[idx]))
+
+    def remap_segments(self, segments):
+        """Rewrite Whisper segment (and word) timestamps in place."""
+        for segment in segments:
+            segment["start"] = self.to_original(segment["start"])
+            segment["end"] = self.to_original(segment["end"])
+            for word in segment.get("words", []):
+                word["start"] = self.to_original(word["start"])
+                word["end"] = self.to_original(word["end"])
+        return segments
+
+
+def is_quiet(samples, rate, frame_ms=30, speech_dbfs=SPEECH_DBFS):
+    """True if the loud frames (90th-percentile energy) stay below speech_dbfs: room noise, not speech."""
+    energy, _, _ = frame_features(samples, rate, frame_ms)
+    return not len(energy) or np.percentile(energy, 90) <= speech_dbfs
+
+
+def remove_silence(samples, rate, keep_silence=0.3, **kwargs):
+    """Drop non-speech spans and return the compressed audio with its TimestampMap, or (None, None)."""
+    spans = detect_speech(samples, rate, **kwargs)
+    if not spans:
+        return None, None
+
+    gap = np.zeros(int(keep_silence * rate), dtype=samples.dtype)
+    pieces, compressed_starts, original_starts = [], [], []
+    position = 0
+    for start, end in spans:
+        compressed_starts.append(position / rate)
+        original_starts.append(start / rate)
+        pieces.append(samples[start:end])
+        pieces.append(gap)
+        position += end - start + len(gap)
+
+    compressed = np.concatenate(pieces)
+    logging.info(f"VAD kept {len(compressed) / rate:.1f}s of {len(samples) / rate:.1f}s of audio.")
+    return compressed, TimestampMap(compressed_starts, original_starts)
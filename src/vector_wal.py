@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+import struct
+import numpy as np
+
+
+class VectorWAL:
+    """Append-only log of (vector, document) records added to a FAISS index since it was last saved."""
+
+    HEADER = struct.Struct("<QII")  # (position in the index, vector dimension, payload bytes) per record
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(self.path):
+            open(self.path, "wb").close()
+        self.records = 0  # Records currently in the log, counted by replay()
+
+    def append(self, first_position, vectors, texts, metadatas):
+        """Log vectors added to the index at first_position onwards, with their documents, and sync to disk."""
+        with open(self.path, "ab") as f:
+            for i, (vector, text, metadata) in enumerate(zip(vectors, texts, metadatas)):
+                vector = np.asarray(vector, dtype=np.float32)
+                payload = json.dumps({"text": text, "metadata": metadata}).encode()
+                f.write(self.HEADER.pack(first_position + i, vector.size, len(payload)))
+                f.write(vector.tobytes())
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.records += len(texts)
+
+    def replay(self, skip_below=0):
+        """Return (vectors, texts, metadatas) for records at position skip_below or later, in order.
+
+        Records already in the saved index are skipped, and a partly written last record is dropped.
+        """
+        vectors, texts, metadatas = [], [], []
+        self.records = 0
+        good = 0
+        with open(self.path, "r+b") as f:
+            while True:
+                header = f.read(self.HEADER.size)
+                if len(header) < self.HEADER.size:
+                    break
+                position, dim, payload_size = self.HEADER.unpack(header)
+                vector_bytes = f.read(dim * 4)
+                payload = f.read(payload_size)
+                if len(vector_bytes) < dim * 4 or len(payload) < payload_size:
+                    break
+                good = f.tell()
+                self.records += 1
+                if position < skip_below:
+                    continue
+                record = json.loads(payload)
+                vectors.append(np.frombuffer(vector_bytes, dtype=np.float32))
+                texts.append(record["text"])
+                metadatas.append(record["metadata"])
+            f.truncate(good)
+        if self.records:
+            logging.info(f"Replayed {len(texts)} of {self.records} logged vectors from {self.path}.")
+        return vectors, texts, metadatas
+
+    def reset(self):
+        """Empty the log once its records are part of the saved index."""
+        with open(self.path, "wb") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self.records = 0
@@ -1,11 +1,14 @@
+import heapq
 import logging
 import os
-from langchain.vectorstores import FAISS
-from langchain.embeddings import SpacyEmbeddings
+import re
+import threading
 from langchain.text_splitter import CharacterTextSplitter
 from dotenv import load_dotenv
-import spacy
 from langchain.docstore.document import Document
+from src.index_shard import IndexShard
+from src.chat_history import GENERAL_SUBJECT
+from src.embedding_engine import SpacyBatchEmbeddings
 
 # Ensure the Logs directory exists
 log_dir = os.path.join("Phineas_AI", "Data", "Logs")
@@ -20,100 +23,154 @@ logging.basicConfig(
 )
 
 class EmbeddingManager:
+    """Per-subject FAISS shards; queries go to the shards of the subjects asked about and are merged."""
+
     def __init__(self):
         # Load environment variables from .env file
         load_dotenv()
 
-        # Load spaCy model
-        self.nlp = spacy.load("en_core_web_sm")  # Load the spaCy model
-        self.embeddings = SpacyEmbeddings()  # Initialize SpacyEmbeddings with spaCy model
-
-        # Path to the FAISS index file
-        index_dir = os.path.join("Phineas_AI", "Data", "Database")
-        self.index_file = os.path.join(index_dir, "faiss_index.bin")
+        # spaCy vectors computed in batches, with only the components doc.vector needs, and cached on disk
+        self.embeddings = SpacyBatchEmbeddings()
 
-        # Try to load an existing FAISS index
-        self.faiss_index = self._load_faiss_index()
+        # The original single index holds general (and pre-sharding) documents; each subject gets its own shard
+        self.index_dir = os.path.join("Phineas_AI", "Data", "Database")
+        self.shards_dir = os.path.join(self.index_dir, "Shards")
+        if not os.path.exists(self.shards_dir):
+            os.makedirs(self.shards_dir)
+        self.shards = {}  # Shard name -> IndexShard, loaded on first use
+        self.lock = threading.Lock()  # Guards self.shards; each shard has its own lock
 
         logging.info("EmbeddingManager initialized.")
 
-    def get_dir(self, index_dir):
-        self.index_file = os.path.join(index_dir, "faiss_index.bin")
-        
-
-    def _save_faiss_index(self):
-        """Save the FAISS index to a file."""
-        if self.faiss_index is not None:
-            self.faiss_index.save_local(self.index_file)
-            logging.info(f"FAISS index saved to {self.index_file}.")
-
-    def _load_faiss_index(self):
-        """Load the FAISS index from a file."""
-        if os.path.exists(self.index_file):
-            try:
-                logging.info(f"Loading FAISS index from {self.index_file}.")
-                return FAISS.load_local(self.index_file, self.embeddings)
-            except Exception as e:
-                logging.error(f"Failed to load FAISS index: {e}")
-                return None
-        logging.info("No existing FAISS index found. Starting fresh.")
-        return None
-
-    def create_embeddings(self, input_texts):
-        """Create embeddings and store them in the FAISS index."""
+    @staticmethod
+    def shard_name(subject):
+        return re.sub(r"[^\w\- ]", "_", subject) if subject else GENERAL_SUBJECT
+
+    def shard(self, subject=None):
+        """Return the shard for subject (None for general documents), loading it on first use."""
+        name = self.shard_name(subject)
+        with self.lock:
+            if name not in self.shards:
+                index_dir = self.index_dir if name == GENERAL_SUBJECT else os.path.join(self.shards_dir, name)
+                self.shards[name] = IndexShard(name, index_dir, self.embeddings)
+            return self.shards[name]
+
+    def subjects(self):
+        """Names of all shards on disk, general first."""
+        return [GENERAL_SUBJECT] + sorted(name for name in os.listdir(self.shards_dir)
+                                          if os.path.isdir(os.path.join(self.shards_dir, name)))
+
+    def _route(self, subjects):
+        """Shards to search: the given subjects' shards, or every shard when subjects is None."""
+        names = self.subjects() if subjects is None else [self.shard_name(s) for s in subjects]
+        return [self.shard(None if name == GENERAL_SUBJECT else name) for name in names]
+
+    def compact(self):
+        for shard in list(self.shards.values()):
+            shard.compact()
+
+    def create_embeddings(self, input_texts, subject=None, metadata=None):
+        """Create embeddings and store them in the subject's FAISS shard.
+
+        metadata (e.g. lecture date and source type) is stored with every chunk alongside the subject.
+        Chunks duplicating stored ones or each other are skipped; returns counts of what was dropped.
+        """
         try:
             logging.info("Creating embeddings for input texts.")
 
             # Split texts into manageable chunks
             splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+            base_metadata = dict(metadata or {}, subject=subject or GENERAL_SUBJECT)
             docs = []
 
             for text in input_texts:
                 chunks = splitter.split_text(text)
                 for chunk in chunks:
-                    docs.append(Document(page_content=chunk))
-
-            # Create a new FAISS index or append to the existing one
-            if self.faiss_index:
-                logging.info("Appending new documents to the existing FAISS index.")
-                self.faiss_index.add_documents(docs)
-            else:
-                logging.info("Creating a new FAISS index with the provided documents.")
-                self.faiss_index = FAISS.from_documents(docs, self.embeddings)
-
-            # Save the updated index to disk
-            self._save_faiss_index()
-            logging.info("Embeddings created and stored in FAISS index.")
+                    docs.append(Document(page_content=chunk, metadata=dict(base_metadata)))
+
+            # Drop exact and SimHash near-duplicates before paying for their embeddings
+            shard = self.shard(subject)
+            chunks = len(docs)
+            docs = [docs[i] for i in shard.deduplicate([doc.page_content for doc in docs])]
+            lexical_duplicates = chunks - len(docs)
+
+            # Embed outside the lock so searches are not held up
+            vectors = self.embeddings.embed_matrix([doc.page_content for doc in docs])
+
+            # Then drop chunks whose vectors are nearly identical to stored ones, such as reworded summaries
+            keep = shard.distinct(vectors)
+            vector_duplicates = len(docs) - len(keep)
+            docs, vectors = [docs[i] for i in keep], vectors[keep]
+
+            if docs:
+                shard.add([doc.page_content for doc in docs], vectors, [doc.metadata for doc in docs])
+            stats = {
+                "chunks": chunks,
+                "added": len(docs),
+                "lexical_duplicates": lexical_duplicates,
+                "vector_duplicates": vector_duplicates,
+            }
+            logging.info(f"Embeddings created and stored in FAISS index: {stats}")
+            return stats
         except Exception as e:
             logging.error(f"Error creating embeddings: {e}")
             raise e
 
-    def query_embeddings(self, query_text, k=3):
+    def search(self, query_texts, k=3, subjects=None):
+        """Top k (distance, document) hits per query, merged across the routed shards, closest first."""
+        shards = [shard for shard in self._route(subjects) if len(shard)]
+        if not shards:
+            raise ValueError("FAISS index is empty. Create embeddings first.")
+
+        vectors = self.embeddings.embed_matrix(query_texts)
+        merged = [[] for _ in query_texts]
+        for shard in shards:
+            for hits, shard_hits in zip(merged, shard.search(vectors, k)):
+                hits.extend(shard_hits)
+        return [heapq.nsmallest(k, hits, key=lambda hit: hit[0]) for hits in merged]
+
+    def query_embeddings(self, query_text, k=3, subjects=None):
         """Search for similar documents in the FAISS index."""
         try:
-            if not self.faiss_index:
-                raise ValueError("FAISS index is empty. Create embeddings first.")
-
             logging.info(f"Querying FAISS index for: {query_text}")
 
             # Search for similar documents
-            results = self.faiss_index.similarity_search(query_text, k=k)
-        
+            results = self.search([query_text], k, subjects)[0]
+
             # If no results are found, return None
             if not results:
                 logging.info("No similar documents found.")
                 return None
-        
-            return [result.page_content for result in results]
+
+            return [doc.page_content for _, doc in results]
+        except Exception as e:
+            logging.error(f"Error querying embeddings: {e}")
+            raise e
+
+
+    def query_embeddings_with_scores(self, query_text, k=3, subjects=None):
+        """Search for similar documents and return (text, distance) pairs, closest first."""
+        try:
+            logging.info(f"Querying FAISS index with scores for: {query_text}")
+            return [(doc.page_content, distance) for distance, doc in self.search([query_text], k, subjects)[0]]
         except Exception as e:
             logging.error(f"Error querying embeddings: {e}")
             raise e
 
+    def query_many_with_scores(self, query_texts, k=3, subjects=None):
+        """Search for many queries at once: one embedding batch and one FAISS search per shard for all of them.
 
+        Returns one list of (text, distance) pairs per query, closest first, in input order.
+        """
+        if not query_texts:
+            return []
+        logging.info(f"Querying FAISS index for {len(query_texts)} queries in one batch.")
+        return [[(doc.page_content, distance) for distance, doc in hits]
+                for hits in self.search(query_texts, k, subjects)]
 
 # Example usage
 if __name__ == "__main__":
-    embedding_manager = EmbeddingManager(index_file="faiss_index.bin")
+    embedding_manager = EmbeddingManager()
 
     # Add initial data
     texts = [
@@ -0,0 +1,79 @@
+import importlib
+import logging
+import threading
+import time
+
+
+class Warmup:
+    """Build heavy components on a background thread in priority order, on demand if needed sooner."""
+
+    def __init__(self):
+        self._components = {}  # Name -> (priority, module, attribute, args)
+        self._values = {}
+        self._errors = {}
+        self._ready = {}  # Name -> Event set once the component is built or has failed
+        self._building = set()
+        self._lock = threading.Lock()
+        self.timings = {}  # Name -> (import seconds, init seconds)
+        self.window_shown = None  # Seconds from launch until the window appeared
+        self._thread = None
+
+    def register(self, name, module, attribute=None, args=(), priority=0):
+        """Register module.attribute(*args) to be built; lower priority values are built first."""
+        self._components[name] = (priority, module, attribute, args)
+        self._ready[name] = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        start = time.perf_counter()
+        for name in sorted(self._components, key=lambda n: self._components[n][0]):
+            self._build(name)
+        logging.info(f"Warm-up finished in {time.perf_counter() - start:.2f}s.\n{self.report()}")
+
+    def _build(self, name):
+        with self._lock:
+            if name in self._building or self._ready[name].is_set():
+                return
+            self._building.add(name)
+
+        _, module_name, attribute, args = self._components[name]
+        try:
+            start = time.perf_counter()
+            module = importlib.import_module(module_name)
+            imported = time.perf_counter()
+            value = getattr(module, attribute)(*args) if attribute else module
+            self._values[name] = value
+            self.timings[name] = (imported - start, time.perf_counter() - imported)
+        except Exception as e:
+            logging.error(f"Failed to initialize {name}: {e}")
+            self._errors[name] = e
+        finally:
+            self._ready[name].set()
+
+    def get(self, name):
+        """Return a component, building it now if the background thread has not reached it yet."""
+        self._build(name)  # No-op if it is already built or being built
+        self._ready[name].wait()
+        if name in self._errors:
+            raise self._errors[name]
+        return self._values[name]
+
+    def is_ready(self, name):
+        """True once the component is built or has failed; check error() before get()."""
+        return self._ready[name].is_set()
+
+    def error(self, name):
+        """The exception building the component raised, or None."""
+        return self._errors.get(name)
+
+    def report(self):
+        """Per-component import and init time, slowest first."""
+        lines = ["Startup timing (import / init):"]
+        if self.window_shown is not None:
+            lines.append(f"  window shown after {self.window_shown:.2f}s")
+        for name, (imported, init) in sorted(self.timings.items(), key=lambda item: -sum(item[1])):
+            lines.append(f"  {name:<10} {imported:6.2f}s / {init:6.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,165 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from src.audiostream import WHISPER_RATE, read_wav_float32
+
+MODEL_SIZES = ["tiny", "base", "small", "medium"]
+
+
+def _total_memory_gb():
+    """Physical memory in GB, or None where sysconf is unavailable (Windows)."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def probe_model_size():
+    """Pick the largest model this machine should run at a usable speed."""
+    import torch
+    if torch.cuda.is_available():
+        gpu_gb = torch.cuda.get_device_properties(0).total_memory / 1024 ** 3
+        return "medium" if gpu_gb >= 6 else "small"
+    cores = os.cpu_count() or 1
+    memory = _total_memory_gb()
+    if cores >= 8 and (memory is None or memory >= 8):
+        return "base"
+    return "tiny"
+
+
+class TimedModel:
+    """A shared Whisper model that serializes transcribe calls and records the real-time factor."""
+
+    def __init__(self, name, model, registry, quantized=False):
+        self.name = name
+        self.cache_name = f"{name}-int8" if quantized else name  # Quantized output differs slightly
+        self.model = model
+        self.registry = registry
+        # Whisper installs kv-cache hooks on the model during decoding, so calls must not overlap
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio, **options):
+        with self._lock:
+            start = time.perf_counter()
+            result = self.model.transcribe(audio, **options)
+            elapsed = time.perf_counter() - start
+        if isinstance(audio, str):
+            segments = result.get("segments") or [{"end": 0.0}]
+            audio_seconds = segments[-1]["end"]
+        else:
+            audio_seconds = len(audio) / WHISPER_RATE
+        self.registry.record(self.name, audio_seconds, elapsed)
+        return result
+
+    def __getattr__(self, attr):
+        return getattr(self.model, attr)
+
+
+class WhisperRegistry:
+    """Process-wide cache of Whisper models, loaded lazily on first use."""
+
+    def __init__(self):
+        load_dotenv()
+        self.default_name = os.getenv("PHINEAS_WHISPER_MODEL")  # tiny/base/small/medium, probed if unset
+        self.quantize = os.getenv("PHINEAS_WHISPER_QUANTIZE", "").lower() in ("1", "true", "yes")
+        self._models = {}
+        self._stats = {}  # Model name -> [audio seconds, processing seconds]
+        self._lock = threading.Lock()
+
+    def resolve_name(self, name=None):
+        if name:
+            return name
+        if not self.default_name:
+            self.default_name = probe_model_size()
+            logging.info(f"Selected Whisper model '{self.default_name}' from hardware probe.")
+        return self.default_name
+
+    def get(self, name=None):
+        """Return the shared model, loading it the first time it is requested."""
+        name = self.resolve_name(name)
+        with self._lock:
+            if name not in self._models:
+                model, quantized = self._load(name)
+                self._models[name] = TimedModel(name, model, self, quantized)
+            return self._models[name]
+
+    def _load(self, name):
+        import whisper
+        start = time.perf_counter()
+        model = whisper.load_model(name)
+        quantized = False
+        if self.quantize and model.device.type == "cpu":
+            model, quantized = self._quantize(name, model)
+        logging.info(f"Loaded Whisper model '{name}'{' (int8)' if quantized else ''} "
+                     f"in {time.perf_counter() - start:.1f}s.")
+        return model, quantized
+
+    @staticmethod
+    def _quantize(name, model):
+        """int8 dynamic quantization of the Linear layers, which dominate CPU decoding time.
+
+        Returns (model, quantized); on failure the float32 model is kept and a warning logged.
+        """
+        import torch
+        import whisper
+        try:
+            # torch only converts modules whose type is exactly nn.Linear. Whisper's Linear subclass just
+            # casts its weights to the input dtype in forward, a no-op in float32 on the CPU
+            for module in model.modules():
+                if type(module) is whisper.model.Linear:
+                    module.__class__ = torch.nn.Linear
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        except Exception as e:
+            logging.warning(f"Could not quantize Whisper model '{name}' ({e}), running it in float32.")
+            return model, False
+        quantized = any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in model.modules())
+        if not quantized:
+            logging.warning(f"Quantization left Whisper model '{name}' unchanged, running it in float32.")
+        return model, quantized
+
+    def record(self, name, audio_seconds, elapsed):
+        with self._lock:
+            stats = self._stats.setdefault(name, [0.0, 0.0])
+            stats[0] += audio_seconds
+            stats[1] += elapsed
+        if audio_seconds:
+            logging.info(f"Whisper '{name}': {audio_seconds:.1f}s of audio in {elapsed:.1f}s "
+                         f"(RTF {elapsed / audio_seconds:.2f}).")
+
+    def real_time_factor(self, name=None):
+        """Processing time divided by audio time; below 1.0 is faster than real time."""
+        audio_seconds, elapsed = self._stats.get(self.resolve_name(name), (0.0, 0.0))
+        return elapsed / audio_seconds if audio_seconds else None
+
+    def report(self):
+        return {name: self.real_time_factor(name) for name in self._stats}
+
+
+registry = WhisperRegistry()
+
+
+def get_model(name=None):
+    return registry.get(name)
+
+
+def benchmark(audio_file, names=MODEL_SIZES):
+    """Transcribe one sample with each model and report its real-time factor and text."""
+    audio = read_wav_float32(audio_file)
+    results = {}
+    for name in names:
+        text = get_model(name).transcribe(audio)["text"]
+        results[name] = (registry.real_time_factor(name), text)
+        print(f"{name:>7}: RTF {results[name][0]:.2f} | {text[:80]}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Whisper model speed on a sample recording.")
+    parser.add_argument("audio", help="16-bit PCM WAV sample")
+    parser.add_argument("--models", nargs="+", default=MODEL_SIZES, help="Models to compare")
+    args = parser.parse_args()
+
+    benchmark(args.audio, args.models)